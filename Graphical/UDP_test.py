@@ -1,12 +1,13 @@
 import socket
-import json
 import time
 import numpy as np
+from wire import EncodeRequest, DecodeReply
 
 # 创建UDP套接字
 sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 sock.bind(("localhost", 9798))
 
+seq = 0
 while True:
     # 发送数据
     # Pcur = [[82863,90452,3000], [84972,90727,3000]]
@@ -16,17 +17,14 @@ while True:
 
     Pcur = [[1,2,0], [3,4,0], [5,6,0], [7,8,0], [8,7,0], [6,5,0], [4,3,0], [2,1,0]]
     p_search = [[10,20,0], [15,10,0], [20,15,0], [20,30,0], [25,15,0], [20,10,0]]
-    N = max(len(Pcur), len(p_search))
-    ViewR = [3 for i in range(N)]
+    ViewR = [3 for i in range(len(Pcur))]
 
-    dic = {"Pcur": Pcur, "ViewR": ViewR, "p_search": p_search}
-    s = json.dumps(dic)
-
-    sock.sendto(s.encode(), ("localhost", 9797))
+    sock.sendto(EncodeRequest(Pcur, p_search, seq=seq, radii=ViewR), ("localhost", 9797))
 
     # 接收结果
-    data, addr = sock.recvfrom(1024)
-    res = json.loads(data.decode())
-    # print(res["p_next"])
+    data, addr = sock.recvfrom(65536)
+    res_seq, p_next = DecodeReply(data)
+    # print(res_seq, p_next)
 
+    seq += 1
     time.sleep(1)
@@ -1,113 +1,77 @@
 import numpy as np
 from numpy.lib.function_base import _parse_input_dimensions
-from swarms import Drone, Swarm, Unit, List
+from swarms import Drone, Swarm, Unit, List, IndexCSR
 from itertools import permutations
 from collections import deque
+from assignment import MakeLocalSolver
+from payoff import PayoffMatrix, PositionMatrix
+from spatial import SpatialIndex
+from metrics import Timed
+
+# cos theta of the central and view cones in the paper, for GetNeighborhood
+COS_CENTRAL = 0.9975
+COS_VIEW = 0.985
 
 class Algorithm:
-    def __init__(self):
-        pass
+    def __init__(self, local_solver="hungarian", metrics=None):
+        # engine for the per-subtree assignment in CalcCETree, see assignment.py
+        self.local_solver = MakeLocalSolver(local_solver)
+        # optional metrics.Metrics, stage timings and counters of this decision
+        self.metrics = metrics
 
+    @Timed("list")
     def ConstructList(self, H, I):
-        len_I = len(I.drones)
-        len_H = len(H.drones)
-        T = List(H, "Task")
-        W = List(I, "Worker")
-        W.num = T.num = max(len_I, len_H)
-
-        if len_I == len_H:
-            # T.units = H.drones
-            for d in H.drones:
-                T.units.append(Unit(d, d.id, "Task"))
-                T.id_map[d.id] = T.units[-1]
-            # W.units = I.drones
-            for d in I.drones:
-                W.units.append(Unit(d, d.id, "Worker"))
-                W.id_map[d.id] = W.units[-1]
-        elif len_I < len_H:
-            t = (len_H - 1) // len_I + 1
-            # T.units = H.drones
-            for d in H.drones:
-                T.units.append(Unit(d, d.id, "Task"))
-                T.id_map[d.id] = T.units[-1]
-            cnt = 0
-            for k in range(t):
-                for i in range(len_I):
-                    W.units.append(Unit(I.drones[i], cnt, "Worker"))
-                    W.id_map[cnt] = W.units[-1]
-                    cnt += 1
-                    if cnt >= len_H:
-                        break
-                if cnt >= len_H:
-                        break
-        else:
-            t = (len_I - 1) // len_H + 1
-            cnt = 0
-            for k in range(t):
-                for i in range(len_H):
-                    T.units.append(Unit(H.drones[i], cnt, "Task"))
-                    T.id_map[cnt] = T.units[-1]
-                    cnt += 1
-                    if cnt >= len_I:
-                        break
-                if cnt >= len_I:
-                        break
-            # W.units = I.drones
-            for d in I.drones:
-                W.units.append(Unit(d, d.id, "Worker"))
-                W.id_map[d.id] = W.units[-1]
-
+        # both lists get max(len_I, len_H) units, unit k copies drone k % len of
+        # the smaller swarm
+        len_I = I.num
+        len_H = H.num
+        num = max(len_I, len_H)
+        T = List(H, "Task", np.arange(num) % len_H)
+        W = List(I, "Worker", np.arange(num) % len_I)
         return T, W
 
-    def GetNeighborhood(self, T, W):
-        pos_sum = np.array([0., 0., 0.])
-        for i in range(W.num):
-            pos_sum += W.units[i].position
-        W.center = pos_sum / W.num
-
-        pos_sum = np.array([0., 0., 0.])
-        for i in range(T.num):
-            pos_sum += T.units[i].position
-        T.center = pos_sum / T.num
+    @Timed("neighborhood")
+    def GetNeighborhood(self, T, W, view_R=None, cos_central=None, cos_view=None):
+        # view_R (scalar, per unit or per worker drone) keeps tasks closer than it in the NTLs,
+        # cos_central / cos_view keep tasks inside the cone around the swarm
+        # direction (COS_CENTRAL / COS_VIEW in the paper). None keeps every task.
+        W_pos = PositionMatrix(W)
+        T_pos = PositionMatrix(T)
+        W.center = W_pos.sum(axis=0) / W.num
+        T.center = T_pos.sum(axis=0) / T.num
 
-        # calc NWLs in uniti
-        for i in range(W.num):
-            for j in range(W.num):
-                if W.G[i][j] == 1:
-                    W.units[i].NWL.append({"id":j})
-            # print("NeighborWL {}: {}".format(i, W.units[i].NWL))
+        # NWLs are the graph neighbors, W.Neighbors(i)
 
         # calc NTLs in uniti
         self.direction = T.center - W.center
         self.direction /= np.linalg.norm(self.direction)
         # print("direction: {}".format(self.direction))
-        for i in range(W.num):
-            for j in range(T.num):
-                di = T.units[j].position - W.units[i].position
-                # if di.dot(self.direction) / np.linalg.norm(di) > 0.9975:   # cos theta
-                #     W.units[i].NTL_central.append({"id":j})
-                # if di.dot(self.direction) / np.linalg.norm(di) > 0.985:   # cos theta
-                #     W.units[i].NTL.append({"id":j})
-                W.units[i].NTL_central.append({"id":j})
-                W.units[i].NTL.append({"id":j})
-            # print("NeighborTL_central {}: {}".format(i, W.units[i].NTL_central))
-            # print("NeighborTL {}: {}".format(i, W.units[i].NTL))
-
-    def CalcPayoff(self, T, W, M):
+        radii = np.full(W.num, np.inf)
+        if view_R is not None:
+            view_R = np.asarray(view_R, dtype=float).reshape(-1)
+            # one per unit, or one per worker drone for the units that copy it
+            radii[:] = view_R[W.parent_ids] if 1 < view_R.size < W.num else view_R[:W.num]
+        index = SpatialIndex(T_pos)
+        centrals = index.QueryCones(W_pos, self.direction, cos_central, radii)
+        views = index.QueryCones(W_pos, self.direction, cos_view, radii)
+        W.NTL_central_indptr, W.NTL_central_indices = IndexCSR(centrals)
+        W.NTL_indptr, W.NTL_indices = IndexCSR(views)
+        W.NTL_mask = np.zeros((W.num, T.num), dtype=bool)
+        W.NTL_mask[np.repeat(np.arange(W.num), np.diff(W.NTL_indptr)), W.NTL_indices] = True
+
+    @Timed("payoff")
+    def CalcPayoff(self, T, W, M, dist=None):
         self.M = M
-        for i in range(W.num):
-            for t in W.units[i].NTL:
-                t["payoff"] = self.M - np.linalg.norm(W.units[i].position - T.units[t["id"]].position)
-            # print("NeighborTL {}: {}".format(i, W.units[i].NTL))
+        # dense W x T matrix indexed by unit ids; NTL entries read it lazily
+        self.payoff = PayoffMatrix(T, W, M, mask=getattr(W, "NTL_mask", None), dist=dist)
+        W.payoff = self.payoff
 
+    @Timed("solve")
     def Hungarian(self, T, W):
         self.hungarian_result = list()
         from scipy.optimize import linear_sum_assignment
-        payoffmat = np.zeros((T.num, W.num))
+        payoffmat = self.payoff[np.ix_(W.order, T.order)]
         # print("shape:", payoffmat.shape)
-        for i in range(W.num):
-            for j in range(T.num):
-                payoffmat[i][j] = self.M - np.linalg.norm(W.units[i].position - T.units[j].position)
         cost = -payoffmat
         row_ind, col_ind = linear_sum_assignment(cost)
         # # print("Hungarian result: {}".format(col_ind))
@@ -116,22 +80,19 @@ class Algorithm:
             self.hungarian_result.append([T.units[row_ind[i]], W.units[col_ind[i]]])
 
         GlobalPayoff = -cost[row_ind, col_ind].sum()
+        self.hungarian_payoff = GlobalPayoff
         # print("GlobalPayoff: {}".format(GlobalPayoff))
         # print()
 
     def CalcCE(self, u, W):
         per = permutations([i for i in range(len(u.NTL_central))], len(u.NWL))  # p[i] means u.NWL[i]["id"] choose u.NTL_central[p[i]]
+        payoff = self.payoff.Local([a["id"] for a in u.NWL], [a["id"] for a in u.NTL_central])
         maxv = -1e10
         maxp = None
         for p in per:
             ulocal = 0
             for i, v in enumerate(p):
-                # find payoff
-                # # print(W.units[u.NWL[i]["id"]].NTL)
-                for tl in W.units[u.NWL[i]["id"]].NTL:
-                    if tl["id"] == u.NTL_central[v]["id"]:
-                        ulocal += tl["payoff"]
-                        break
+                ulocal += payoff[i][v]
             # # print("unit {}: p: {}, ulocal: {}".format(u.id, p, ulocal))
             if ulocal > maxv:
                 maxv = ulocal
@@ -150,7 +111,7 @@ class Algorithm:
         nodes = [r]
         for c in r.children:
             nodes.append(c)
-        tasks = [a["id"] for a in r.val.NTL_central]
+        tasks = W.TaskNeighbors(r.val.id, central=True).tolist()
         # print("before", r.val.id, tasks)
         # print("parent_select", r.parent_select)
         for sel in r.parent_select:
@@ -160,52 +121,35 @@ class Algorithm:
         # extend field of view
         # # print("len_tasks: {}, len_nodes: {}".format(len(tasks), len(nodes)))
         if len(tasks) < len(nodes):
-            tasks = [a["id"] for a in r.val.NTL]
+            tasks = W.TaskNeighbors(r.val.id).tolist()
             for sel in r.parent_select:
                 if sel in tasks:
                     tasks.remove(sel)
             # print("after-after", r.val.id, tasks)
 
-        per = permutations([i for i in range(len(tasks))], len(nodes))  # p[i] means u.NWL[i]["id"] choose u.NTL_central[p[i]]
-        maxv = -1e10
-        maxp = None
-        for p in per:
-            ulocal = 0
-            for i, v in enumerate(p):
-                # find payoff
-                # # print(W.units[u.NWL[i]["id"]].NTL)
-                is_found = False
-                for w in W.units:
-                    if w.id == nodes[i].val.id:
-                        for tl in w.NTL:
-                            if tl["id"] == tasks[v]:
-                                ulocal += tl["payoff"]
-                                is_found = True
-                                break
-                        if is_found:
-                            break
-            # # print("unit {}: p: {}, ulocal: {}".format(u.id, p, ulocal))
-            if ulocal > maxv:
-                maxv = ulocal
-                maxp = p
-
-        if maxp is not None:
-            # print("unit {} choose task {}".format(r.val.id, tasks[maxp[0]]))
-            return True, tasks[maxp[0]]
+        payoff = self.payoff.Local([n.val.id for n in nodes], tasks)
+        select = self.local_solver.Solve(payoff)
+        if self.metrics is not None:
+            self.metrics.Count("cetree_calls")
+            self.metrics.Count("cetree_evaluated", self.local_solver.evaluated)
+
+        if select is not None:
+            # print("unit {} choose task {}".format(r.val.id, tasks[select]))
+            return True, tasks[select]
+        view = W.TaskNeighbors(r.val.id)
+        if len(view) == 0:
+            # nothing in view
+            return False, None
         else:
-            maxc, maxi = 0, 0
-            for i, a in enumerate(r.val.NTL):
-                # # print(a)
-                if a["payoff"] > maxc:
-                    maxc = a["payoff"]
-                    maxi = i
-            return False, r.val.NTL[maxi]["id"]
+            row = self.payoff[r.val.id, view]
+            maxi = int(np.argmax(row)) if row.max() > 0 else 0
+            return False, int(view[maxi])
 
 
+    @Timed("solve")
     def SolveGG(self, T, W):
-        for i in range(W.num):
-            W.units[i].cohesion = np.linalg.norm(W.units[i].position - W.center)
-        W.units.sort(key=lambda x: (x.cohesion))
+        W.cohesion[:] = np.linalg.norm(W.positions - W.center, axis=1)
+        W.order[:] = W.order[np.argsort(W.cohesion[W.order], kind="stable")]
         # print(W)
 
         # # Direct allocation
@@ -220,18 +164,23 @@ class Algorithm:
         # Tree Graphical allocation
         self.max_tree_width = 4
         self.tree_result = list()
+        # children are taken in cohesion order from the neighbor lists
+        rank = np.empty(W.num, dtype=int)
+        rank[W.order] = np.arange(W.num)
         root = TreeNode(W.units[0])
         open_table = deque()
         open_table.append(root)
         close_table = []
+        discovered = {root.val.id}
         while len(open_table) != 0:
             r = open_table.popleft()
             r.children = list()
             close_table.append(r)
             cnt = 0
-            for i in range(W.num):
-                tmpid = W.units[i].id
-                if W.G[r.val.id][tmpid] == 1 and tmpid not in [a.val.id for a in close_table] and tmpid not in [a.val.id for a in open_table]:
+            for i in np.sort(rank[W.Neighbors(r.val.id)]).tolist():
+                tmpid = int(W.order[i])
+                if tmpid not in discovered:
+                    discovered.add(tmpid)
                     c = TreeNode(W.units[i], children=list())
                     r.children.append(c)
                     open_table.append(c)
@@ -268,7 +217,7 @@ class Algorithm:
             if r_select is not None:
                 if is_success:
                     Coverage += 1
-                    GlobalPayoff += self.M - np.linalg.norm(r.val.position - T.units[r_select].position)
+                    GlobalPayoff += self.payoff[r.val.id, T.units[r_select].id]
                     previous_select.append(r_select)
                 self.tree_result.append([r.val, T.units[r_select]])
             for c in r.children:
@@ -281,6 +230,10 @@ class Algorithm:
                 # c.parent_select = previous_select.copy()    # shallow copy
                 stash.append(c)
         # print()
+        if self.metrics is not None:
+            self.metrics.Count("bfs_nodes", len(close_table))
+        self.coverage = Coverage
+        self.tree_payoff = GlobalPayoff
         # print("Coverage: {}\nGlobalPayoff: {}".format(Coverage, GlobalPayoff))
 
     def Reallocation(self, T, W):
@@ -0,0 +1,210 @@
+import numpy as np
+from itertools import permutations
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+
+class LocalAssignment:
+    """Per-subtree assignment used by Algorithm.CalcCETree.
+
+    payoff is a k x n matrix, row 0 is the subtree root and rows 1..k-1 its
+    children, columns are the candidate tasks (k <= n). Solve returns the
+    column chosen by the root in a payoff-maximizing one-to-one assignment,
+    or None when k > n. Among equally good assignments the root takes the
+    smallest column, which is what the permutation enumeration returned.
+    evaluated is the work of the last Solve: permutations for the
+    enumeration, search nodes for branch and bound, exact sub-solves for
+    Hungarian and DP.
+    """
+    tol = 1e-9
+    evaluated = 0
+
+    def Value(self, payoff):
+        # best total payoff over all one-to-one assignments of the rows,
+        # exact solvers override this with something faster than enumeration
+        k, n = payoff.shape
+        rows = np.arange(k)
+        maxv = -1e10
+        for p in permutations(range(n), k):
+            self.evaluated += 1
+            maxv = max(maxv, payoff[rows, list(p)].sum())
+        return maxv
+
+    def Solve(self, payoff):
+        payoff = np.asarray(payoff, dtype=float)
+        k, n = payoff.shape
+        self.evaluated = 0
+        if k == 0 or k > n:
+            return None
+        if k == 1:
+            return int(np.argmax(payoff[0]))
+
+        best = self.Value(payoff)
+        eps = self.tol * max(1., abs(best))
+        rest = payoff[1:]
+        # children solved without the root is an upper bound for every root choice
+        bound = self.Value(rest)
+        cols = np.arange(n)
+        for v in np.flatnonzero(payoff[0] + bound >= best - eps):
+            if payoff[0, v] + self.Value(rest[:, cols != v]) >= best - eps:
+                return int(v)
+        return int(np.argmax(payoff[0]))
+
+
+def ReduceColumns(payoff):
+    # Each row only ever needs its k best columns: the other k-1 rows can
+    # block at most k-1 of them. Keeps at most k*k columns.
+    k, n = payoff.shape
+    if n <= k * k:
+        return payoff
+    top = np.argpartition(-payoff, k - 1, axis=1)[:, :k]
+    return payoff[:, np.unique(top)]
+
+
+class PermutationAssignment(LocalAssignment):
+    """Reference enumeration over itertools.permutations, O(n!/(n-k)!)."""
+
+    def Solve(self, payoff):
+        payoff = np.asarray(payoff, dtype=float)
+        k, n = payoff.shape
+        maxv = -1e10
+        maxp = None
+        self.evaluated = 0
+        for p in permutations(range(n), k):
+            self.evaluated += 1
+            ulocal = 0
+            for i, v in enumerate(p):
+                ulocal += payoff[i, v]
+            if ulocal > maxv:
+                maxv = ulocal
+                maxp = p
+        if maxp is not None:
+            return maxp[0]
+
+
+class HungarianAssignment(LocalAssignment):
+    """Exact rectangular Hungarian (scipy linear_sum_assignment)."""
+
+    def Value(self, payoff):
+        self.evaluated += 1
+        cost = -ReduceColumns(payoff)
+        row_ind, col_ind = linear_sum_assignment(cost)
+        return -cost[row_ind, col_ind].sum()
+
+
+class BitmaskDPAssignment(LocalAssignment):
+    """Exact DP over subsets of rows, O(n * k * 2^k) on the reduced columns.
+
+    Rows beyond max_rows fall back to branch and bound.
+    """
+
+    def __init__(self, max_rows=12):
+        self.max_rows = max_rows
+        self.fallback = BranchBoundAssignment()
+
+    def Solve(self, payoff):
+        payoff = np.asarray(payoff, dtype=float)
+        if payoff.shape[0] > self.max_rows:
+            select = self.fallback.Solve(payoff)
+            self.evaluated = self.fallback.evaluated
+            return select
+        return LocalAssignment.Solve(self, payoff)
+
+    def Value(self, payoff):
+        self.evaluated += 1
+        payoff = ReduceColumns(payoff)
+        k, n = payoff.shape
+        masks = np.arange(1 << k)
+        free = [masks[(masks >> i) & 1 == 0] for i in range(k)]
+        dp = np.full(1 << k, -np.inf)
+        dp[0] = 0.
+        for j in range(n):
+            new = dp.copy()
+            for i in range(k):
+                m = free[i]
+                new[m | (1 << i)] = np.maximum(new[m | (1 << i)], dp[m] + payoff[i, j])
+            dp = new
+        return dp[-1]
+
+
+class BranchBoundAssignment(LocalAssignment):
+    """Depth-first branch and bound in permutation order.
+
+    Subtrees whose optimistic bound (row maxima, ignoring conflicts) cannot
+    beat the incumbent are skipped, so the result equals the enumeration.
+    At most max_nodes partial assignments are expanded; past that the best
+    assignment found so far, seeded greedily, is returned.
+    """
+
+    def __init__(self, max_nodes=20000):
+        self.max_nodes = max_nodes
+
+    def Search(self, payoff):
+        payoff = np.asarray(payoff, dtype=float)
+        k, n = payoff.shape
+        if k == 0 or k > n:
+            return -1e10, None
+        # greedy incumbent: rows in order, best free column
+        greedy, used = [], set()
+        for i in range(k):
+            v = max((c for c in range(n) if c not in used), key=lambda c: payoff[i, c])
+            greedy.append(v)
+            used.add(v)
+        greedy_value = sum(payoff[i, v] for i, v in enumerate(greedy))
+        self.best = greedy_value - self.tol * max(1., abs(greedy_value))
+        self.bestp = tuple(greedy)
+        suffix = np.append(np.cumsum(payoff.max(axis=1)[::-1])[::-1], 0.)
+        rows = payoff.tolist()
+        self.nodes = 0
+        taken = [False] * n
+        p = []
+
+        def dfs(i, cur):
+            if i == k:
+                if cur > self.best:
+                    self.best = cur
+                    self.bestp = tuple(p)
+                return
+            row = rows[i]
+            for v in range(n):
+                if taken[v] or cur + row[v] + suffix[i + 1] <= self.best:
+                    continue
+                self.nodes += 1
+                if self.nodes > self.max_nodes:
+                    return
+                taken[v] = True
+                p.append(v)
+                dfs(i + 1, cur + row[v])
+                p.pop()
+                taken[v] = False
+
+        dfs(0, 0.)
+        self.evaluated += self.nodes
+        return max(self.best, greedy_value), self.bestp
+
+    def Solve(self, payoff):
+        self.evaluated = 0
+        _, bestp = self.Search(payoff)
+        if bestp is not None:
+            return bestp[0]
+
+    def Value(self, payoff):
+        return self.Search(payoff)[0]
+
+
+LOCAL_SOLVERS = {
+    "hungarian": HungarianAssignment,
+    "dp": BitmaskDPAssignment,
+    "bnb": BranchBoundAssignment,
+    "permutation": PermutationAssignment,
+}
+
+
+def MakeLocalSolver(solver="hungarian"):
+    if isinstance(solver, LocalAssignment):
+        return solver
+    if solver == "hungarian" and linear_sum_assignment is None:
+        solver = "dp"
+    return LOCAL_SOLVERS[solver]()
@@ -0,0 +1,131 @@
+import os
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from swarms import Swarm
+from algorithm import Algorithm
+
+# Monte Carlo evaluation of the allocator over a stack of scenarios.
+# python batch.py [trials] [workers] [tasks]
+
+
+def UnitIndex(N, m):
+    # parent drone of every unit as built by Algorithm.ConstructList
+    n = max(N, m)
+    return np.arange(n) % N, np.arange(n) % m
+
+
+def BatchAdjacency(positions, R):
+    # B x n x n, same test as swarms.AdjacencyMatrix per scenario
+    diff = positions[:, :, None, :] - positions[:, None, :, :]
+    G = np.einsum("bijk,bijk->bij", diff, diff) < np.square(R)[:, :, None]
+    G[:, np.arange(positions.shape[1]), np.arange(positions.shape[1])] = True
+    return G
+
+
+def BatchDistances(A, B):
+    return np.linalg.norm(A[:, :, None, :] - B[:, None, :, :], axis=-1)
+
+
+def RandomScenarios(trials, N, m, seed=None, R=50):
+    # worker and task swarms scattered over the areas used in main.py
+    rng = np.random.RandomState(seed)
+    lo, hi = np.array([0, 0, 220]), np.array([100, 100, 300])
+    workers = rng.uniform(lo, hi, (trials, N, 3)) + rng.standard_normal((trials, N, 3))
+    lo, hi = np.array([200, 200, 220]), np.array([400, 400, 300])
+    tasks = rng.uniform(lo, hi, (trials, m, 3)) + rng.standard_normal((trials, m, 3))
+    return workers, tasks, np.full((trials, N), float(R))
+
+
+def SolveScenario(workers, tasks, radii, G, dist, M=500, solver="gg", local_solver="hungarian",
+                  task_R=None, cos_central=None, cos_view=None):
+    """One scenario with its unit graph G and unit distances dist precomputed.
+
+    task_R, cos_central and cos_view limit the NTLs as in
+    Algorithm.GetNeighborhood; radii is only the communication radius.
+
+    Returns (assignment, coverage, payoff, time): the task index of every
+    worker as in useGTA, the covered units, the summed payoff and the solve
+    time in ms.
+    """
+    start = time.perf_counter()
+    N, m = len(workers), len(tasks)
+    IS = Swarm(N, camp="Interceptor", swarm_pos=workers, R=radii)
+    HS = Swarm(m, camp="Hostile", swarm_pos=tasks, R=np.resize(radii, m))
+    algs = Algorithm(local_solver)
+    TL, WL = algs.ConstructList(HS, IS)
+    WL.ConstructGraph(G)
+    algs.GetNeighborhood(TL, WL, view_R=task_R, cos_central=cos_central, cos_view=cos_view)
+    algs.CalcPayoff(TL, WL, M=M, dist=dist)
+
+    assignment = np.zeros(N, dtype=int)
+    if solver == "gg":
+        algs.SolveGG(TL, WL)
+        for w, t in algs.tree_result:
+            assignment[w.parent_id] = t.parent_id
+        coverage, payoff = algs.coverage, algs.tree_payoff
+    else:
+        algs.Hungarian(TL, WL)
+        result, payoff = algs.hungarian_result, algs.hungarian_payoff
+        # rows are [T.units[worker row], W.units[task column]], see Algorithm.Hungarian
+        for a, b in result:
+            assignment[WL.units[a.id].parent_id] = TL.units[b.id].parent_id
+        coverage = WL.num
+    return assignment, coverage, float(payoff), (time.perf_counter() - start) * 1000
+
+
+def SolveChunk(args):
+    # (workers, tasks, radii, G, dist) stacks of a chunk and the shared options
+    *stacks, options = args
+    return [SolveScenario(*a, *options) for a in zip(*stacks)]
+
+
+def SolveBatch(workers, tasks, radii=50, M=500, solver="gg", local_solver="hungarian", processes=None, chunk=64,
+               task_R=None, cos_central=None, cos_view=None):
+    """Solves a stack of scenarios, workers B x N x 3 and tasks B x m x 3.
+
+    radii is a scalar, N or B x N. Graphs and distances are computed for a
+    chunk of scenarios at once and the chunks are solved by a pool of
+    processes (processes=1 solves in this process, None uses every core).
+    Returns a dict of arrays: assignment (B x N task index per worker),
+    coverage (B), payoff (B), time (B, ms per scenario) and wall (s).
+    """
+    start = time.perf_counter()
+    workers = np.asarray(workers, dtype=float).reshape(-1, np.shape(workers)[-2], 3)
+    tasks = np.asarray(tasks, dtype=float).reshape(-1, np.shape(tasks)[-2], 3)
+    B, N, m = len(workers), workers.shape[1], tasks.shape[1]
+    radii = np.broadcast_to(np.asarray(radii, dtype=float), (B, N))
+    w_idx, t_idx = UnitIndex(N, m)
+
+    def Chunks():
+        for k in range(0, B, chunk):
+            w, t, r = workers[k:k + chunk], tasks[k:k + chunk], radii[k:k + chunk]
+            wu, tu = w[:, w_idx], t[:, t_idx]
+            yield (w, t, r, BatchAdjacency(wu, r[:, w_idx]), BatchDistances(wu, tu), (M, solver, local_solver, task_R, cos_central, cos_view))
+
+    processes = processes or os.cpu_count()
+    if processes == 1:
+        results = [SolveChunk(c) for c in Chunks()]
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            results = list(pool.map(SolveChunk, Chunks()))
+    results = [r for c in results for r in c]
+    return {
+        "assignment": np.array([r[0] for r in results]).reshape(B, N),
+        "coverage": np.array([r[1] for r in results]),
+        "payoff": np.array([r[2] for r in results]),
+        "time": np.array([r[3] for r in results]),
+        "wall": time.perf_counter() - start,
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    trials, N, m = [int(a) for a in sys.argv[1:4]] + [1000, 20, 20][len(sys.argv[1:4]):]
+    workers, tasks, radii = RandomScenarios(trials, N, m, seed=0)
+    result = SolveBatch(workers, tasks, radii)
+    n = max(N, m)
+    print("{} trials of {} x {} in {:.2f}s ({} processes)".format(trials, N, m, result["wall"], os.cpu_count()))
+    print("coverage rate: mean {:.1f}%, min {:.1f}%".format(100 * result["coverage"].mean() / n, 100 * result["coverage"].min() / n))
+    print("solve time: p50 {:.2f}ms, p95 {:.2f}ms".format(*np.percentile(result["time"], [50, 95])))
@@ -0,0 +1,151 @@
+import sys
+import csv
+import json
+import time
+import argparse
+import numpy as np
+
+from swarms import Swarm
+from algorithm import Algorithm, COS_CENTRAL, COS_VIEW
+
+# Reproducible sweep of the allocation pipeline: decision time per stage,
+# coverage rate and return ratio (tree game payoff / Hungarian optimum).
+# python benchmark.py --workers 10 20 30 40 50 --ratios 1 --seeds 10 --out bench
+# python benchmark.py --workers 20 --ratios 0.5 0.8 1 1.25 2 --out bench_ratio
+# python benchmark.py ... --budget 20 --stage total    # exit 1 if p95 > 20 ms
+# Writes <out>.csv (one row per run) and <out>.json (percentiles per config),
+# the json can be passed to statistics.py / statistics2.py.
+
+STAGES = ["list", "graph", "neighborhood", "payoff", "solve"]
+PERCENTILES = [50, 90, 95, 99, 100]
+
+
+def Scenario(workers, tasks, R, seed):
+    np.random.seed(seed)
+    IS = Swarm(workers, camp="Interceptor", area=[[0,0,220],[100,100,300]], R=R)
+    HS = Swarm(tasks, camp="Hostile", area=[[200,200,220],[400,400,300]], R=R)
+    return IS, HS
+
+
+def RunOnce(workers, tasks, R, seed, solver="gg", M=500, cos_central=None, cos_view=None):
+    IS, HS = Scenario(workers, tasks, R, seed)
+    algs = Algorithm()
+    t = dict()
+    clock = time.perf_counter()
+
+    def Lap(stage):
+        nonlocal clock
+        now = time.perf_counter()
+        t[stage] = (now - clock) * 1000
+        clock = now
+
+    TL, WL = algs.ConstructList(HS, IS)
+    Lap("list")
+    WL.ConstructGraph()
+    Lap("graph")
+    algs.GetNeighborhood(TL, WL, cos_central=cos_central, cos_view=cos_view)
+    Lap("neighborhood")
+    algs.CalcPayoff(TL, WL, M=M)
+    Lap("payoff")
+    # reference optimum, timed separately from the pipeline
+    h = time.perf_counter()
+    algs.Hungarian(TL, WL)
+    t["hungarian"] = (time.perf_counter() - h) * 1000
+    clock = time.perf_counter()
+    if solver == "gg":
+        algs.SolveGG(TL, WL)
+        coverage, payoff = algs.coverage, algs.tree_payoff
+    else:
+        coverage, payoff = WL.num, algs.hungarian_payoff
+    Lap("solve")
+    t["total"] = sum(t[s] for s in STAGES)
+
+    row = {"workers": workers, "tasks": tasks, "ratio": workers / tasks, "R": R, "seed": seed, "solver": solver}
+    row.update({s + "_ms": t[s] for s in STAGES + ["total", "hungarian"]})
+    row["coverage"] = coverage
+    row["coverage_rate"] = 100. * coverage / WL.num
+    row["payoff"] = float(payoff)
+    row["optimum"] = float(algs.hungarian_payoff)
+    row["return_ratio"] = 100. * payoff / algs.hungarian_payoff
+    return row
+
+
+def Summarize(rows):
+    configs = dict()
+    for r in rows:
+        configs.setdefault((r["workers"], r["tasks"], r["R"], r["solver"]), []).append(r)
+    summary = list()
+    for (workers, tasks, R, solver), runs in configs.items():
+        item = {"workers": workers, "tasks": tasks, "ratio": workers / tasks, "R": R, "solver": solver, "runs": len(runs)}
+        for s in STAGES + ["total", "hungarian"]:
+            v = np.percentile([r[s + "_ms"] for r in runs], PERCENTILES)
+            item[s + "_ms"] = {("max" if p == 100 else "p{}".format(p)): float(x) for p, x in zip(PERCENTILES, v)}
+        item["coverage_rate"] = [r["coverage_rate"] for r in runs]
+        item["return_ratio"] = [r["return_ratio"] for r in runs]
+        summary.append(item)
+    return summary
+
+
+def Grouped(path, key):
+    # labels, coverage lists and mean return ratios per value of key, as used
+    # by the boxplots in statistics.py / statistics2.py
+    with open(path) as f:
+        summary = json.load(f)["configs"]
+    labels = sorted(set(c[key] for c in summary))
+    data, ratios = list(), list()
+    for label in labels:
+        runs = [c for c in summary if c[key] == label]
+        data.append(sum((c["coverage_rate"] for c in runs), []))
+        ratios.append(np.average(sum((c["return_ratio"] for c in runs), [])))
+    return labels, data, ratios
+
+
+def Main(argv=None):
+    parser = argparse.ArgumentParser(description="Decision time and coverage benchmark of the GTA pipeline")
+    parser.add_argument("--workers", type=int, nargs="+", default=[10, 20, 30, 40, 50])
+    parser.add_argument("--ratios", type=float, nargs="+", default=[1.], help="|I|/|H|, |H| = round(workers/ratio)")
+    parser.add_argument("--radii", type=float, nargs="+", default=[50.], help="communication radius R")
+    parser.add_argument("--seeds", type=int, default=10, help="seeds 0..seeds-1 per config")
+    parser.add_argument("--solver", choices=["gg", "hungarian"], default="gg")
+    parser.add_argument("--M", type=float, default=500)
+    parser.add_argument("--cones", action="store_true", help="limit the NTLs to the view cones of the paper")
+    parser.add_argument("--out", default="benchmark")
+    parser.add_argument("--budget", type=float, help="p95 budget of --stage in ms")
+    parser.add_argument("--stage", choices=STAGES + ["total"], default="total")
+    args = parser.parse_args(argv)
+    cones = (COS_CENTRAL, COS_VIEW) if args.cones else (None, None)
+
+    rows = list()
+    for workers in args.workers:
+        for ratio in args.ratios:
+            tasks = max(1, int(round(workers / ratio)))
+            for R in args.radii:
+                for seed in range(args.seeds):
+                    rows.append(RunOnce(workers, tasks, R, seed, args.solver, args.M, *cones))
+    summary = Summarize(rows)
+
+    with open(args.out + ".csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()))
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(args.out + ".json", "w") as f:
+        json.dump({"args": vars(args), "configs": summary}, f, indent=2)
+
+    print("{:>7} {:>5} {:>6} {:>9} {:>9} {:>9} {:>9} {:>8} {:>8}".format(
+        "workers", "tasks", "R", "p50", "p95", "p99", "max", "cover", "return"))
+    failed = list()
+    for c in summary:
+        total = c["total_ms"]
+        print("{:>7} {:>5} {:>6g} {:>7.2f}ms {:>7.2f}ms {:>7.2f}ms {:>7.2f}ms {:>7.1f}% {:>7.1f}%".format(
+            c["workers"], c["tasks"], c["R"], total["p50"], total["p95"], total["p99"], total["max"],
+            np.average(c["coverage_rate"]), np.average(c["return_ratio"])))
+        if args.budget is not None and c[args.stage + "_ms"]["p95"] > args.budget:
+            failed.append(c)
+    for c in failed:
+        print("over budget: {} p95 {:.2f}ms > {:.2f}ms (workers={}, tasks={}, R={:g})".format(
+            args.stage, c[args.stage + "_ms"]["p95"], args.budget, c["workers"], c["tasks"], c["R"]))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(Main())
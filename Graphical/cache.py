@@ -0,0 +1,77 @@
+from collections import OrderedDict
+import numpy as np
+
+
+def SolverKey(solver, *options):
+    # solver label of Get/Put extended with solve options that change the result;
+    # arrays are keyed exactly by dtype, shape and bytes (their str() is abbreviated)
+    if all(o is None for o in options):
+        return solver
+    key = [solver]
+    for o in options:
+        a = None if o is None else np.asarray(o)
+        key.append(None if a is None else (a.dtype.str, a.shape, a.tobytes()))
+    return tuple(key)
+
+
+class ResultCache:
+    """LRU cache of allocation results keyed on quantized geometry.
+
+    Worker and task positions and radii are rounded to multiples of
+    tolerance for an O(1) lookup. Inputs that straddle a rounding edge are
+    still found by comparing against the cached inputs of the same solver
+    and counts: a hit needs every coordinate and radius within tolerance.
+    Holds at most size results; the least recently used is evicted first.
+    """
+
+    def __init__(self, size=128, tolerance=0.05):
+        self.size = size
+        self.tolerance = tolerance
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def Key(self, Pcur, ViewR, p_search, solver=""):
+        q = [np.round(a / self.tolerance).astype(np.int64).tobytes() for a in (Pcur, p_search, ViewR)]
+        return (solver, len(Pcur), len(p_search)) + tuple(q)
+
+    def Inputs(self, Pcur, ViewR, p_search):
+        return (np.asarray(Pcur, dtype=float).reshape(-1, 3), np.asarray(ViewR, dtype=float).reshape(-1),
+                np.asarray(p_search, dtype=float).reshape(-1, 3))
+
+    def Close(self, a, b):
+        return all(x.shape == y.shape and np.all(np.abs(x - y) <= self.tolerance) for x, y in zip(a, b))
+
+    def Get(self, Pcur, ViewR, p_search, solver=""):
+        inputs = self.Inputs(Pcur, ViewR, p_search)
+        key = self.Key(inputs[0], inputs[1], inputs[2], solver)
+        if key not in self.entries:
+            key = None
+            for k in reversed(self.entries):
+                if k[:3] == (solver, len(inputs[0]), len(inputs[2])) and self.Close(self.entries[k][0], inputs):
+                    key = k
+                    break
+        if key is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key][1].copy()
+
+    def Put(self, Pcur, ViewR, p_search, p_next, solver=""):
+        inputs = tuple(a.copy() for a in self.Inputs(Pcur, ViewR, p_search))
+        key = self.Key(inputs[0], inputs[1], inputs[2], solver)
+        self.entries[key] = (inputs, np.array(p_next))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def Clear(self):
+        self.entries.clear()
+
+    def Stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "size": len(self.entries), "hit_rate": self.hits / total if total else 0.}
@@ -0,0 +1,65 @@
+import time
+import numpy as np
+
+from swarms import Swarm
+from algorithm import Algorithm
+import auction
+
+# Decision time of the tree game (SolveGG) against the classic auction and
+# Hungarian solvers on identical, seeded instances.
+# python compare_solvers.py
+# The auction solves cold here, as the classic baseline; it is slower than
+# scipy's Hungarian at every size and only pays off warm started from the
+# previous prices (incremental.IncrementalAllocator).
+
+sizes = [10, 20, 50, 100]
+seeds = range(20)
+M = 500
+
+
+def Instance(n, seed, cos_central=None, cos_view=None):
+    np.random.seed(seed)
+    IS = Swarm(n, camp="Interceptor", area=[[0,0,220],[100,100,300]], R=50)
+    HS = Swarm(n, camp="Hostile", area=[[200,200,220],[400,400,300]], R=50)
+    algs = Algorithm()
+    TL, WL = algs.ConstructList(HS, IS)
+    WL.ConstructGraph()
+    algs.GetNeighborhood(TL, WL, cos_central=cos_central, cos_view=cos_view)
+    algs.CalcPayoff(TL, WL, M=M)
+    return algs, TL, WL
+
+
+def Timed(f, *args):
+    t = time.perf_counter()
+    f(*args)
+    return (time.perf_counter() - t) * 1000
+
+
+def ResultPayoff(algs, result):
+    # result rows are [T.units[worker row], W.units[task column]] of the Hungarian matrix
+    return sum(algs.payoff[a.id, b.id] for a, b in result)
+
+
+def SolveAuction(algs, TL, WL):
+    # cold eps-scaling auction on the Hungarian matrix, returns its payoff
+    payoffmat = algs.payoff[np.ix_(WL.order, TL.order)]
+    col_ind, _ = auction.Auction(payoffmat)
+    return payoffmat[np.arange(len(col_ind)), col_ind].sum()
+
+
+if __name__ == "__main__":
+    print("{:>5} {:>12} {:>12} {:>12} {:>10} {:>12}".format("n", "hungarian", "auction", "GG", "auc/GG", "auction gap"))
+    for n in sizes:
+        times = {"hungarian": [], "auction": [], "GG": []}
+        gaps = []
+        for seed in seeds:
+            algs, TL, WL = Instance(n, seed)
+            times["hungarian"].append(Timed(algs.Hungarian, TL, WL))
+            t = time.perf_counter()
+            auction_payoff = SolveAuction(algs, TL, WL)
+            times["auction"].append((time.perf_counter() - t) * 1000)
+            gaps.append(ResultPayoff(algs, algs.hungarian_result) - auction_payoff)
+            times["GG"].append(Timed(algs.SolveGG, TL, WL))
+        med = {k: np.median(v) for k, v in times.items()}
+        print("{:>5} {:>10.3f}ms {:>10.3f}ms {:>10.3f}ms {:>9.1f}x {:>12.2e}".format(
+            n, med["hungarian"], med["auction"], med["GG"], med["auction"] / med["GG"], max(gaps)))
@@ -0,0 +1,115 @@
+import numpy as np
+from payoff import Distances
+from auction import Auction, Complementary
+
+
+class IncrementalAllocator:
+    """Worker-task assignment that is kept and patched between calls.
+
+    Update() takes the current worker and task positions, optionally with
+    stable ids (e.g. mocap slots), and returns p_next like useGTA: for every
+    worker row the index of its task row. Tasks are repeated when there are
+    more workers than tasks, as in Algorithm.ConstructList. Only payoff rows
+    and columns of units that appeared or moved more than threshold since
+    they were last computed are rebuilt. The auction restarts from the last
+    prices and keeps the previous pairs that are still eps-optimal. If
+    nothing changed the previous p_next is returned without solving.
+    """
+
+    def __init__(self, M=500, threshold=0.05, eps=1e-3):
+        self.M = M
+        self.threshold = threshold
+        self.eps = eps
+        self.Reset()
+
+    def Reset(self):
+        self.worker_ids = np.zeros(0, dtype=int)
+        self.worker_pos = np.zeros((0, 3))
+        self.task_ids = np.zeros(0, dtype=int)
+        self.task_pos = np.zeros((0, 3))
+        self.payoff = np.zeros((0, 0))
+        self.prices = dict()    # (task id, copy) -> price
+        self.owner = dict()     # worker id -> (task id, copy)
+        self.p_next = None
+        # rows/columns rebuilt by the last Update
+        self.rows_updated = 0
+        self.cols_updated = 0
+
+    def Match(self, old_ids, old_pos, ids, pos):
+        # index of every id in the previous call (-1 if new), positions to keep,
+        # whether the payoff has to be recomputed and the largest such move
+        index = dict()
+        for k, i in enumerate(old_ids.tolist()):
+            index[i] = k
+        old = np.array([index.get(i, -1) for i in ids.tolist()], dtype=int)
+        moved = old < 0
+        keep = pos.copy()
+        shift = 0.
+        if np.any(~moved):
+            prev = old_pos[old[~moved]]
+            dist = np.linalg.norm(pos[~moved] - prev, axis=-1)
+            stale = dist > self.threshold
+            keep[~moved] = np.where(stale[:, None], pos[~moved], prev)
+            moved[np.flatnonzero(~moved)[stale]] = True
+            shift = dist[stale].max() if np.any(stale) else 0.
+        return old, keep, moved, shift
+
+    def Update(self, Pcur, p_search, worker_ids=None, task_ids=None):
+        Pcur = np.asarray(Pcur, dtype=float).reshape(-1, 3)
+        p_search = np.asarray(p_search, dtype=float).reshape(-1, 3)
+        N, m = len(Pcur), len(p_search)
+        worker_ids = np.arange(N) if worker_ids is None else np.asarray(worker_ids, dtype=int)
+        task_ids = np.arange(m) if task_ids is None else np.asarray(task_ids, dtype=int)
+
+        w_old, w_pos, w_moved, w_shift = self.Match(self.worker_ids, self.worker_pos, worker_ids, Pcur)
+        t_old, t_pos, t_moved, t_shift = self.Match(self.task_ids, self.task_pos, task_ids, p_search)
+        self.rows_updated = int(w_moved.sum())
+        self.cols_updated = int(t_moved.sum())
+        unchanged = (self.p_next is not None and not w_moved.any() and not t_moved.any()
+                     and np.array_equal(w_old, np.arange(len(self.worker_ids)))
+                     and np.array_equal(t_old, np.arange(len(self.task_ids))))
+        self.worker_ids, self.worker_pos = worker_ids, w_pos
+        self.task_ids, self.task_pos = task_ids, t_pos
+        if unchanged:
+            return self.p_next
+
+        payoff = np.empty((N, m))
+        kr, kc = ~w_moved, ~t_moved
+        payoff[np.ix_(kr, kc)] = self.payoff[np.ix_(w_old[kr], t_old[kc])]
+        payoff[w_moved, :] = self.M - Distances(w_pos[w_moved], t_pos)
+        payoff[:, t_moved] = self.M - Distances(w_pos, t_pos[t_moved])
+        self.payoff = payoff
+        if N == 0 or m == 0:
+            self.p_next = np.zeros(N, dtype=int)
+            return self.p_next
+
+        # column c is copy c // m of task c % m
+        n = max(N, m)
+        cols = np.arange(n)
+        keys = list(zip(task_ids[cols % m].tolist(), (cols // m).tolist()))
+        benefit = payoff[:, cols % m]
+        prices = np.array([self.prices.get(k, 0.) for k in keys])
+
+        # warm start from the previous prices and pairs; a benefit changed by at
+        # most the largest move, so that bounds the first eps phase. Anything
+        # new starts from the full benefit range.
+        column = dict()
+        for c, k in enumerate(keys):
+            column[k] = c
+        assignment = np.full(N, -1)
+        for i, w in enumerate(worker_ids.tolist()):
+            assignment[i] = column.get(self.owner.get(w), -1)
+        eps_start = None
+        if (w_old >= 0).all() and (t_old >= 0).all() and all(k in self.prices for k in keys):
+            eps_start = 2 * (w_shift + t_shift) + self.eps
+        else:
+            prices[:] = 0.
+        assignment = Complementary(benefit, prices, assignment, eps_start or self.eps)
+
+        assignment, prices = Auction(benefit, prices, assignment, self.eps, eps_start)
+        self.prices = dict(zip(keys, prices.tolist()))
+        self.owner = dict()
+        for i, w in enumerate(worker_ids.tolist()):
+            self.owner[w] = keys[assignment[i]]
+        self.p_next = cols[assignment] % m
+        return self.p_next
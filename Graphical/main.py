@@ -6,14 +6,15 @@ np.random.seed(random_seed)
 # print("random_seed: {}".format(random_seed))
 
 from swarms import Drone, Swarm, Unit, List
-from algorithm import Algorithm
+from algorithm import Algorithm, COS_CENTRAL, COS_VIEW
 
 import sys
 from logger import Logger
 sys.stdout = Logger()
 
 class GTA:
-    def __init__(self):
+    def __init__(self, cones=False):
+        # cones: limit the NTLs to the view cones of the paper (python main.py --cones)
         self.IS = Swarm(20, camp="Interceptor", area=[[0,0,220],[100,100,300]], R=50)
         self.HS = Swarm(20, camp="Hostile", area=[[200,200,220],[400,400,300]], R=50)
         # print(self.IS)
@@ -24,7 +25,10 @@ class GTA:
         # print(self.WL)
         self.G = self.WL.ConstructGraph()
         # print(self.G)
-        self.algs.GetNeighborhood(self.TL, self.WL)
+        if cones:
+            self.algs.GetNeighborhood(self.TL, self.WL, cos_central=COS_CENTRAL, cos_view=COS_VIEW)
+        else:
+            self.algs.GetNeighborhood(self.TL, self.WL)
         self.algs.CalcPayoff(self.TL, self.WL, M=500)
         self.algs.Hungarian(self.TL, self.WL)
         self.algs.SolveGG(self.TL, self.WL)
@@ -37,5 +41,5 @@ class GTA:
         theater.render()
 
 if __name__ == "__main__":
-    gta = GTA()
+    gta = GTA(cones="--cones" in sys.argv[1:])
     gta.main()
\ No newline at end of file
@@ -7,6 +7,7 @@ np.random.seed(random_seed)
 
 from swarms import Drone, Swarm, Unit, List
 from algorithm import Algorithm
+from metrics import Stage
 
 import sys
 from logger import Logger
@@ -16,69 +17,106 @@ import socket
 import struct
 import time
 import json
+from wire import DecodeRequest, EncodeReply
+from cache import ResultCache, SolverKey
 
-def useGTA(Pcur, ViewR, p_search):
+# 结果缓存，由SetCache在每个求解进程中创建
+result_cache = None
+
+def useGTA(Pcur, ViewR, p_search, metrics=None, cache=None, task_R=None, cos_central=None, cos_view=None):
+    # metrics: optional metrics.Metrics, one record is committed per call
+    # cache: optional cache.ResultCache, returns the stored p_next for (nearly) the same inputs
+    # task_R, cos_central, cos_view: task range and view cones of Algorithm.GetNeighborhood,
+    # ViewR is only the communication radius of the worker graph
     N = np.size(Pcur, 0)
-    IS = Swarm(N, camp="Interceptor", swarm_pos=Pcur, R=ViewR)
     m = np.size(p_search, 0)
-    HS = Swarm(m, camp="Hostile", swarm_pos=p_search, R=ViewR)
+    label = SolverKey("hungarian", task_R, cos_central, cos_view)
+    if cache is not None:
+        with Stage(metrics, "cache"):
+            p_next = cache.Get(Pcur, ViewR, p_search, label)
+        if p_next is not None:
+            if metrics is not None and metrics.enabled:
+                metrics.Commit(N=N, m=m, solver="hungarian", cached=True)
+            return p_next
+    with Stage(metrics, "list"):
+        IS = Swarm(N, camp="Interceptor", swarm_pos=Pcur, R=ViewR)
+        HS = Swarm(m, camp="Hostile", swarm_pos=p_search, R=ViewR)
     # print(IS)
     # print(HS)
-    algs = Algorithm()
+    algs = Algorithm(metrics=metrics)
     TL, WL = algs.ConstructList(HS, IS)
     # print(TL)
     # print(WL)
-    G = WL.ConstructGraph()
+    with Stage(metrics, "graph"):
+        G = WL.ConstructGraph()
     # print(G)
-    algs.GetNeighborhood(TL, WL)
+    algs.GetNeighborhood(TL, WL, view_R=task_R, cos_central=cos_central, cos_view=cos_view)
     algs.CalcPayoff(TL, WL, M=500)
     algs.Hungarian(TL, WL)
-    p_next = [0 for i in range(N)]
-    for r in algs.hungarian_result:
-        # print(r[1].id, r[0].id)
-        p_next[r[1].id] = TL.units[r[0].id].parent_id
-    return np.array(p_next)
+    with Stage(metrics, "mapping"):
+        p_next = np.zeros(N, dtype=int)
+        # rows are [T.units[worker row], W.units[task column]], see Algorithm.Hungarian;
+        # with more tasks than workers unit k copies worker k % N, keep the first copy
+        for w, t in algs.hungarian_result:
+            if w.id < N:
+                p_next[WL.units[w.id].parent_id] = TL.units[t.id].parent_id
+    if cache is not None:
+        cache.Put(Pcur, ViewR, p_search, p_next, label)
+    if metrics is not None and metrics.enabled:
+        metrics.Commit(N=N, m=m, solver="hungarian")
+    return p_next
 
 
-if __name__ == "__main__":
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.bind(("localhost", 9797))
+def SetCache(size, tolerance):
+    global result_cache
+    result_cache = ResultCache(size, tolerance) if size > 0 else None
+
+
+def SolveArrays(Pcur, p_search, radii=None):
+    N = max(np.size(Pcur, 0), np.size(p_search, 0))
+    ViewR = np.array([1000. for i in range(N)])
+    if radii is not None:
+        ViewR[:len(radii)] = radii
 
-    while True:
-        # 接收数据
-        data, addr = sock.recvfrom(8192)
-        data_raw = struct.unpack("450d", data)
-        data_np = np.reshape(data_raw, (150,3))
-        data_Pcur = data_np[:100,:]
-        data_p_search = data_np[100:,:]
-        
-        N, m = 0, 0
-        for i in range(100):
-            if not np.any(data_Pcur[i]):
-                break
-            N += 1
-        Pcur = data_Pcur[:N,:]
-        for i in range(50):
-            if not np.any(data_p_search[i]):
-                break
-            m += 1
-        p_search = data_p_search[:m,:]
-        # print("Pcur:", Pcur)
-        # print("p_search", p_search)
+    # 处理数据
+    p_next = useGTA(Pcur, ViewR, p_search, cache=result_cache)
+    # print("p_next:", p_next)
+    return p_next
 
-        N = max(N, m)
-        ViewR = np.array([1000 for i in range(N)])
 
-        # 处理数据
-        p_next = useGTA(Pcur, ViewR, p_search)
-        # print("p_next:", p_next)
+def SolveRequest(data):
+    # 解析请求（新格式或旧的450d格式），求解并按请求格式编码结果
+    request = DecodeRequest(data)
+    # print("Pcur:", request.workers)
+    # print("p_search", request.tasks)
+    return EncodeReply(request, SolveArrays(request.workers, request.tasks, request.radii))
+
+
+if __name__ == "__main__":
+    import argparse
+    from udp_server import Serve
+    parser = argparse.ArgumentParser(description="allocation server (UDP or shared memory)")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=9797)
+    parser.add_argument("--reply-port", type=int, help="reply to this port of the sender host instead of the sender port (9798 for old clients)")
+    parser.add_argument("--workers", type=int, help="solver pool size, default one per core")
+    parser.add_argument("--threads", action="store_true", help="solve in threads instead of processes")
+    parser.add_argument("--report", type=float, default=0, help="print request counters every REPORT seconds")
+    parser.add_argument("--transport", choices=["udp", "shm"], default="udp", help="shm: shared memory channel for a simulator on this machine")
+    parser.add_argument("--shm-name", default="gta_allocation")
+    parser.add_argument("--max-workers", type=int, default=100, help="shm channel capacity")
+    parser.add_argument("--max-tasks", type=int, default=50, help="shm channel capacity")
+    parser.add_argument("--cache-size", type=int, default=0, help="results kept per solver process, 0 disables the cache")
+    parser.add_argument("--cache-tolerance", type=float, default=0.05, help="position/radius quantization of the cache key")
+    args = parser.parse_args()
+    cache_args = (args.cache_size, args.cache_tolerance)
 
-        # 发送结果
-        p_next_zeros = np.zeros(100)
-        ll = len(p_next)
-        p_next_zeros[:ll] = p_next
-        data_p_next = p_next_zeros.flatten()
-        data_p_next_raw = struct.pack(f"{len(data_p_next)}d", *data_p_next)
-        sock.sendto(data_p_next_raw, ("localhost", 9798))
-        
-        time.sleep(0.1)
\ No newline at end of file
+    if args.transport == "shm":
+        # 共享内存通道，客户端见shm_transport.SharedChannel
+        from shm_transport import ServeShared
+        SetCache(*cache_args)
+        ServeShared(SolveArrays, name=args.shm_name, max_workers=args.max_workers, max_tasks=args.max_tasks)
+    else:
+        # 接收数据、求解、按发送方地址返回结果；同一客户端积压的旧请求只保留最新一条
+        Serve(SolveRequest, host=args.host, port=args.port, workers=args.workers, threads=args.threads,
+              reply_port=args.reply_port, report=args.report, initializer=SetCache, initargs=cache_args)
@@ -7,33 +7,55 @@ np.random.seed(random_seed)
 
 from swarms import Drone, Swarm, Unit, List
 from algorithm import Algorithm
+from metrics import Stage
+from cache import SolverKey
 
 import sys
 from logger import Logger
 sys.stdout = Logger()
 
-def useGTA(Pcur, ViewR, p_search):
+def useGTA(Pcur, ViewR, p_search, metrics=None, cache=None, task_R=None, cos_central=None, cos_view=None):
+    # metrics: optional metrics.Metrics, one record is committed per call
+    # cache: optional cache.ResultCache, returns the stored p_next for (nearly) the same inputs
+    # task_R, cos_central, cos_view: task range and view cones of Algorithm.GetNeighborhood,
+    # ViewR is only the communication radius of the worker graph
     N = np.size(Pcur, 0)
-    IS = Swarm(N, camp="Interceptor", swarm_pos=Pcur, R=ViewR)
     m = np.size(p_search, 0)
-    HS = Swarm(m, camp="Hostile", swarm_pos=p_search, R=ViewR)
+    label = SolverKey("gg", task_R, cos_central, cos_view)
+    if cache is not None:
+        with Stage(metrics, "cache"):
+            p_next = cache.Get(Pcur, ViewR, p_search, label)
+        if p_next is not None:
+            if metrics is not None and metrics.enabled:
+                metrics.Commit(N=N, m=m, solver="gg", cached=True)
+            return p_next
+    with Stage(metrics, "list"):
+        IS = Swarm(N, camp="Interceptor", swarm_pos=Pcur, R=ViewR)
+        HS = Swarm(m, camp="Hostile", swarm_pos=p_search, R=ViewR)
     # print(IS)
     # print(HS)
-    algs = Algorithm()
+    algs = Algorithm(metrics=metrics)
     TL, WL = algs.ConstructList(HS, IS)
     # print(TL)
     # print(WL)
-    G = WL.ConstructGraph()
+    with Stage(metrics, "graph"):
+        G = WL.ConstructGraph()
     # print(G)
-    algs.GetNeighborhood(TL, WL)
+    algs.GetNeighborhood(TL, WL, view_R=task_R, cos_central=cos_central, cos_view=cos_view)
     algs.CalcPayoff(TL, WL, M=500)
     # algs.Hungarian(TL, WL)
     algs.SolveGG(TL, WL)
 
-    p_next = [0 for i in range(N)]
-    for r in algs.tree_result:
-        p_next[r[0].parent_id] = HS.drones[r[1].parent_id].id
-    return np.array(p_next)
+    with Stage(metrics, "mapping"):
+        p_next = [0 for i in range(N)]
+        for r in algs.tree_result:
+            p_next[r[0].parent_id] = HS.drones[r[1].parent_id].id
+        p_next = np.array(p_next)
+    if cache is not None:
+        cache.Put(Pcur, ViewR, p_search, p_next, label)
+    if metrics is not None and metrics.enabled:
+        metrics.Commit(N=N, m=m, solver="gg", coverage=algs.coverage)
+    return p_next
 
 
 if __name__ == "__main__":
@@ -0,0 +1,124 @@
+import json
+import time
+import functools
+from collections import deque
+import numpy as np
+
+
+class Metrics:
+    """Stage timings and counters of allocation decisions.
+
+    Stage() times a block and Count() bumps a counter of the current
+    decision; both accumulate if repeated. Commit() closes the decision:
+    the record {"time", "stages" (ms), "counters", ...} is kept in a ring
+    buffer of the last size decisions and handed to every sink, a callable
+    taking the record (see FileSink, or a ROS publisher in allocation.py).
+    Pass metrics=None to Algorithm / useGTA to skip all of it.
+    """
+
+    def __init__(self, size=256, sinks=(), enabled=True):
+        self.records = deque(maxlen=size)
+        self.sinks = list(sinks)
+        self.enabled = enabled
+        self.Clear()
+
+    def Clear(self):
+        self.stages = dict()
+        self.counters = dict()
+
+    def Add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.) + seconds * 1000
+
+    def Count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def Stage(self, name):
+        return StageTimer(self, name)
+
+    def Commit(self, **extra):
+        record = {"time": time.time(), "stages": self.stages, "counters": self.counters}
+        record["stages"]["total"] = sum(v for k, v in self.stages.items() if k != "total")
+        record.update(extra)
+        self.Clear()
+        self.records.append(record)
+        for sink in self.sinks:
+            sink(record)
+        return record
+
+    def Last(self):
+        return self.records[-1] if self.records else None
+
+    def Summary(self, percentiles=(50, 95, 99)):
+        # per stage percentiles (ms) over the buffered decisions
+        summary = dict()
+        names = sorted(set(k for r in self.records for k in r["stages"]))
+        for name in names:
+            v = [r["stages"][name] for r in self.records if name in r["stages"]]
+            summary[name] = dict(zip(["p{}".format(p) for p in percentiles], np.percentile(v, percentiles).tolist()))
+        return summary
+
+
+class StageTimer:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.Add(self.name, time.perf_counter() - self.start)
+
+
+class NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+NULL_STAGE = NullStage()
+
+
+def Stage(metrics, name):
+    # with Stage(metrics, "graph"): ... , a no-op when metrics is None or disabled
+    if metrics is None or not metrics.enabled:
+        return NULL_STAGE
+    return StageTimer(metrics, name)
+
+
+def Timed(stage):
+    # times an Algorithm method into self.metrics under stage
+    def decorator(f):
+        @functools.wraps(f)
+        def timed(self, *args, **kwargs):
+            metrics = self.metrics
+            if metrics is None or not metrics.enabled:
+                return f(self, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return f(self, *args, **kwargs)
+            finally:
+                metrics.Add(stage, time.perf_counter() - start)
+        return timed
+    return decorator
+
+
+class FileSink:
+    """Appends every record as one JSON line to path."""
+
+    def __init__(self, path):
+        self.file = open(path, "a")
+
+    def __call__(self, record):
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
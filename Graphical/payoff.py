@@ -0,0 +1,59 @@
+import numpy as np
+
+
+def PositionMatrix(L):
+    # N x 3 positions of a List, row k is the unit with id k
+    return np.asarray(L.positions, dtype=float).reshape(-1, 3)
+
+
+def Distances(A, B):
+    return np.linalg.norm(A[:, None, :] - B[None, :, :], axis=-1)
+
+
+class PayoffMatrix:
+    """W x T payoff M - |w - t|, computed once per decision.
+
+    Rows are worker unit ids, columns task unit ids, so mat[i, j] is an
+    O(1) lookup that stays valid after SolveGG reorders W.units. mask, when
+    given, marks the (worker, task) pairs present in the worker's NTL;
+    Local() reports 0 for the others, as the dict lookups did. dist may be
+    passed in when it was computed beforehand (see batch.py).
+    """
+
+    def __init__(self, T, W, M, mask=None, dist=None):
+        self.M = M
+        self.worker_pos = PositionMatrix(W)
+        self.task_pos = PositionMatrix(T)
+        self.dist = Distances(self.worker_pos, self.task_pos) if dist is None else dist
+        self.mat = M - self.dist
+        self.mask = mask
+
+    def __getitem__(self, idx):
+        return self.mat[idx]
+
+    def Local(self, workers, tasks):
+        idx = np.ix_(workers, tasks)
+        if self.mask is None:
+            return self.mat[idx]
+        return np.where(self.mask[idx], self.mat[idx], 0.)
+
+
+class TaskEntry(dict):
+    """NTL item {"id": j} whose "payoff" is read from owner.payoff on first access.
+
+    Keeps the per-unit dict view for old callers without building it
+    eagerly in CalcPayoff.
+    """
+    __slots__ = ("owner", "worker")
+
+    def __init__(self, owner, worker, id):
+        dict.__init__(self, id=id)
+        self.owner = owner
+        self.worker = worker
+
+    def __missing__(self, key):
+        if key == "payoff" and getattr(self.owner, "payoff", None) is not None:
+            value = self.owner.payoff.mat[self.worker, self["id"]]
+            self["payoff"] = value
+            return value
+        raise KeyError(key)
@@ -0,0 +1,158 @@
+import time
+import signal
+import numpy as np
+from multiprocessing import shared_memory
+
+# Request/reply rings in one shared memory block for a simulator running on
+# the same machine as the allocation server (python main_UDP.py --transport shm).
+#
+# header int64[8]: magic | max_workers | max_tasks | slots | request seq | reply seq
+# request slot:    int64[4] version, N, M, has radii
+#                  float64 workers max_workers x 3, tasks max_tasks x 3, radii max_workers
+# reply slot:      int64[2] version, N | int64 p_next max_workers
+#
+# Message s (1, 2, ...) goes to slot s % slots. Its version is 2s-1 while it is
+# written and 2s once complete, so a reader that sees a different version
+# before and after reading knows the slot was overwritten. One writer per
+# ring: the simulator writes requests, the server writes replies.
+
+MAGIC = 0x47544153484d3031     # "GTASHM01"
+REQUEST_SEQ = 4
+REPLY_SEQ = 5
+
+
+class SharedChannel:
+    def __init__(self, name, create=False, max_workers=100, max_tasks=50, slots=4):
+        if create:
+            size = 8 * (8 + slots * (4 + 3 * max_workers + 3 * max_tasks + max_workers) + slots * (2 + max_workers))
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:
+                # left over by a server that was killed
+                shared_memory.SharedMemory(name=name).unlink()
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            try:
+                # attaching must not unlink the block when this process exits (python < 3.13)
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+            except Exception:
+                pass
+        self.owner = create
+        self.header = np.ndarray(8, dtype=np.int64, buffer=self.shm.buf)
+        if create:
+            self.header[:] = [MAGIC, max_workers, max_tasks, slots, 0, 0, 0, 0]
+        elif self.header[0] != MAGIC:
+            raise ValueError("{} is not an allocation channel".format(name))
+        self.max_workers, self.max_tasks, self.slots = [int(v) for v in self.header[1:4]]
+        W, T = self.max_workers, self.max_tasks
+
+        offset = 8 * 8
+        self.requests = list()
+        for k in range(self.slots):
+            meta = np.ndarray(4, dtype=np.int64, buffer=self.shm.buf, offset=offset)
+            data = np.ndarray(3 * W + 3 * T + W, dtype=np.float64, buffer=self.shm.buf, offset=offset + 32)
+            self.requests.append((meta, data[:3 * W].reshape(W, 3), data[3 * W:3 * (W + T)].reshape(T, 3), data[3 * (W + T):]))
+            offset += 32 + 8 * len(data)
+        self.replies = list()
+        for k in range(self.slots):
+            meta = np.ndarray(2, dtype=np.int64, buffer=self.shm.buf, offset=offset)
+            self.replies.append((meta, np.ndarray(W, dtype=np.int64, buffer=self.shm.buf, offset=offset + 16)))
+            offset += 16 + 8 * W
+
+    # simulator side
+
+    def Send(self, workers, tasks, radii=None):
+        workers = np.asarray(workers, dtype=float).reshape(-1, 3)
+        tasks = np.asarray(tasks, dtype=float).reshape(-1, 3)
+        N, M = len(workers), len(tasks)
+        if N == 0 or M == 0:
+            raise ValueError("request without workers or tasks ({} x {})".format(N, M))
+        if N > self.max_workers or M > self.max_tasks:
+            raise ValueError("channel holds at most {} workers and {} tasks".format(self.max_workers, self.max_tasks))
+        seq = int(self.header[REQUEST_SEQ]) + 1
+        meta, w, t, r = self.requests[seq % self.slots]
+        meta[0] = 2 * seq - 1
+        meta[1:] = N, M, radii is not None
+        w[:N] = workers
+        t[:M] = tasks
+        if radii is not None:
+            r[:N] = radii
+        meta[0] = 2 * seq
+        self.header[REQUEST_SEQ] = seq
+        return seq
+
+    def Receive(self, seq, timeout=None, poll=1e-4):
+        # p_next of request seq (None on timeout or if the reply was overwritten)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.header[REPLY_SEQ] < seq:
+            if deadline is not None and time.monotonic() > deadline:
+                return None
+            time.sleep(poll)
+        meta, p_next = self.replies[seq % self.slots]
+        N = int(meta[1])
+        result = p_next[:N].copy()
+        if meta[0] != 2 * seq:
+            return None
+        return result
+
+    # server side
+
+    def Latest(self, last_seq):
+        # (seq, workers, tasks, radii) of the newest request after last_seq, or
+        # None; older unanswered requests are skipped
+        seq = int(self.header[REQUEST_SEQ])
+        if seq <= last_seq:
+            return None
+        meta, w, t, r = self.requests[seq % self.slots]
+        N, M, has_radii = [int(v) for v in meta[1:]]
+        workers, tasks = w[:N].copy(), t[:M].copy()
+        radii = r[:N].copy() if has_radii else None
+        if meta[0] != 2 * seq:
+            return None
+        return seq, workers, tasks, radii
+
+    def Reply(self, seq, p_next):
+        meta, out = self.replies[seq % self.slots]
+        meta[0] = 2 * seq - 1
+        meta[1] = len(p_next)
+        out[:len(p_next)] = p_next
+        meta[0] = 2 * seq
+        self.header[REPLY_SEQ] = seq
+
+    def close(self):
+        # drop the numpy views before releasing the buffer
+        self.header = self.requests = self.replies = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def Interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def ServeShared(solve, name="gta_allocation", max_workers=100, max_tasks=50, slots=4, poll=1e-4):
+    # solve(workers, tasks, radii) -> p_next, answering the newest request each time
+    channel = SharedChannel(name, create=True, max_workers=max_workers, max_tasks=max_tasks, slots=slots)
+    # unlink the block on kill as well
+    signal.signal(signal.SIGTERM, Interrupt)
+    last = 0
+    try:
+        while True:
+            request = channel.Latest(last)
+            if request is None:
+                time.sleep(poll)
+                continue
+            seq, workers, tasks, radii = request
+            try:
+                channel.Reply(seq, solve(workers, tasks, radii))
+            except Exception as e:
+                print("request {} failed: {!r}".format(seq, e))
+                channel.Reply(seq, [])
+            last = seq
+    except KeyboardInterrupt:
+        pass
+    finally:
+        channel.close()
@@ -0,0 +1,63 @@
+import numpy as np
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+
+class SpatialIndex:
+    """Radius and view-cone queries over a fixed N x 3 point set.
+
+    Uses scipy's cKDTree when available, otherwise a brute-force distance
+    pass. Every query returns ascending point indices, so results do not
+    depend on the backend. Radii are strict (d < R), like ConstructGraph.
+    """
+
+    def __init__(self, points):
+        self.points = np.asarray(points, dtype=float).reshape(-1, 3)
+        self.tree = cKDTree(self.points) if cKDTree is not None and len(self.points) else None
+
+    def QueryRadius(self, centers, radii):
+        centers = np.asarray(centers, dtype=float).reshape(-1, 3)
+        radii = np.broadcast_to(np.asarray(radii, dtype=float), (len(centers),))
+        if self.tree is None:
+            d2 = np.square(centers[:, None, :] - self.points[None, :, :]).sum(axis=-1)
+            return [np.flatnonzero(row < r * r) for row, r in zip(d2, radii)]
+        result = list()
+        for c, r, cand in zip(centers, radii, self.tree.query_ball_point(centers, radii, return_sorted=True)):
+            cand = np.asarray(cand, dtype=np.intp)
+            # the tree is inclusive at d == r
+            result.append(cand[np.square(self.points[cand] - c).sum(axis=-1) < r * r])
+        return result
+
+    def QueryCones(self, centers, direction, cos_theta, radii=np.inf):
+        # per center: points within its radius whose bearing from the center is
+        # within acos(cos_theta) of direction (no angular limit if cos_theta is None)
+        centers = np.asarray(centers, dtype=float).reshape(-1, 3)
+        radii = np.broadcast_to(np.asarray(radii, dtype=float), (len(centers),))
+        if np.all(np.isinf(radii)):
+            every = np.arange(len(self.points))
+            cands = [every for c in centers]
+        else:
+            cands = self.QueryRadius(centers, radii)
+        if cos_theta is None:
+            return cands
+        result = list()
+        for c, cand in zip(centers, cands):
+            di = self.points[cand] - c
+            with np.errstate(invalid="ignore", divide="ignore"):
+                inside = di.dot(direction) / np.linalg.norm(di, axis=-1) > cos_theta
+            result.append(cand[inside])
+        return result
+
+    def QueryCone(self, center, direction, cos_theta, radius=np.inf):
+        return self.QueryCones(center, direction, cos_theta, radius)[0]
+
+    def RadiusGraph(self, radii):
+        # boolean adjacency, G[i][j] when |p_j - p_i| < radii[i], diagonal set
+        n = len(self.points)
+        G = np.zeros((n, n), dtype=bool)
+        for i, cols in enumerate(self.QueryRadius(self.points, radii)):
+            G[i, cols] = True
+        np.fill_diagonal(G, True)
+        return G
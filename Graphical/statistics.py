@@ -1,3 +1,4 @@
+import sys
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -11,6 +12,11 @@ data = [[80, 70, 80, 90, 90, 80, 80, 80, 100, 80],
 labels = [10, 20, 30, 40, 50]
 ax2x = [1, 2, 3, 4, 5]
 ratios = [1101/1344*100, 2524/3055*100, 3928/4455*100, 5042/5464*100, 5924/6910*100]
+if len(sys.argv) > 1:
+    # python statistics.py bench.json, from benchmark.py
+    from benchmark import Grouped
+    labels, data, ratios = Grouped(sys.argv[1], "workers")
+    ax2x = list(range(1, len(labels) + 1))
 ave = [np.average(a) for a in data]
 # print(ave)
 
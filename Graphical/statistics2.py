@@ -1,3 +1,4 @@
+import sys
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -14,6 +15,11 @@ data = [[92.5, 90, 90, 92.5, 95, 97.5, 95, 92.5, 97.5, 90],
          100, 100, 100, 100, 100, 100, 100, 100, 100, 100]]
 labels = [0.5, 0.8, 1, 1.25, 2]
 ax2x = [1, 2, 3, 4, 5]
+if len(sys.argv) > 1:
+    # python statistics2.py bench_ratio.json, from benchmark.py
+    from benchmark import Grouped
+    labels, data, ratios = Grouped(sys.argv[1], "ratio")
+    ax2x = list(range(1, len(labels) + 1))
 ave = [np.average(a) for a in data]
 # print(ave)
 
@@ -1,16 +1,95 @@
 import numpy as np
+from spatial import SpatialIndex
+from payoff import TaskEntry
+
+# above this many drones the graph is built from a spatial index instead of all pairs
+DENSE_GRAPH_LIMIT = 512
+
+
+def AdjacencyMatrix(positions, R):
+    # G[i][j] is True when j lies within radius R[i] of i, diagonal always set
+    P = np.asarray(positions, dtype=float).reshape(-1, 3)
+    R = np.asarray(R, dtype=float).reshape(-1)[:len(P)]
+    if len(P) > DENSE_GRAPH_LIMIT:
+        return SpatialIndex(P).RadiusGraph(R)
+    diff = P[:, None, :] - P[None, :, :]
+    G = np.einsum("ijk,ijk->ij", diff, diff) < np.square(R).reshape(-1, 1)
+    np.fill_diagonal(G, True)
+    return G
+
+
+def NeighborCSR(G):
+    # (indptr, indices): neighbors of i are indices[indptr[i]:indptr[i+1]], ascending
+    rows, cols = np.nonzero(G)
+    indptr = np.zeros(len(G) + 1, dtype=np.intp)
+    np.cumsum(np.bincount(rows, minlength=len(G)), out=indptr[1:])
+    return indptr, cols
+
+
+def IndexCSR(lists):
+    # (indptr, indices) of a list of index arrays, row i is indices[indptr[i]:indptr[i+1]]
+    indptr = np.zeros(len(lists) + 1, dtype=np.intp)
+    np.cumsum([len(a) for a in lists], out=indptr[1:])
+    indices = np.concatenate(lists).astype(np.intp) if len(lists) else np.zeros(0, dtype=np.intp)
+    return indptr, indices
+
+
+class Views:
+    """Sequence of views cls(owner, row) over a structure of arrays.
+
+    order maps positions in the sequence to rows; views are created on
+    access, sort() only rewrites order.
+    """
+    __slots__ = ("owner", "cls", "order")
+
+    def __init__(self, owner, cls, order):
+        self.owner = owner
+        self.cls = cls
+        self.order = order
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return [self.cls(self.owner, i) for i in self.order[k].tolist()]
+        return self.cls(self.owner, int(self.order[k]))
+
+    def __iter__(self):
+        for i in self.order.tolist():
+            yield self.cls(self.owner, i)
+
+    def sort(self, key=None, reverse=False):
+        self.order[:] = [v.index for v in sorted(self, key=key, reverse=reverse)]
+
 
 class Drone:
-    def __init__(self, id, camp="", mu=[2.,3.,4.], sigma=[[1.,0.,0.],[0.,1.,0.],[0.,0.,1.]], drone_pos=None, R=0):
-        self.id = id
-        self.camp = camp
-        self.R = R
-        if drone_pos is not None:
-            self.position = np.array(drone_pos)
-        else:
-            self.mu = mu
-            self.sigma = sigma
-            self.position = np.random.multivariate_normal(self.mu, self.sigma)
+    """Drone index of a Swarm, positions and radii live in the swarm arrays."""
+    __slots__ = ("owner", "index")
+
+    def __init__(self, owner, index):
+        self.owner = owner
+        self.index = index
+
+    @property
+    def id(self):
+        return self.index
+
+    @property
+    def camp(self):
+        return self.owner.camp
+
+    @property
+    def R(self):
+        return self.owner.R[self.index]
+
+    @property
+    def position(self):
+        return self.owner.positions[self.index]
+
+    @position.setter
+    def position(self, value):
+        self.owner.positions[self.index] = value
 
     def __str__(self):
         return "id: {}; position: {};".format(self.id, self.position)
@@ -23,21 +102,19 @@ class Swarm:
         self.area = area
         self.sigma = sigma
         if isinstance(R, float) or isinstance(R, int):
-            self.R = [R for i in range(self.num)]
+            self.R = np.full(self.num, float(R))
         elif isinstance(R, list) or isinstance(R, np.ndarray):
-            self.R = R
-        self.drones = list()
+            self.R = np.asarray(R, dtype=float).reshape(-1)[:self.num]
         if swarm_pos is not None:
             # print("self.num:", self.num)
             # print("self.R:", self.R)
-            for i in range(self.num):
-                drone = Drone(id=i, camp=self.camp, drone_pos=swarm_pos[i], R=self.R[i])
-                self.drones.append(drone)
+            self.positions = np.array(swarm_pos, dtype=float).reshape(-1, 3)[:self.num]
         else:
+            self.positions = np.empty((self.num, 3))
             for i in range(self.num):
                 mu = [np.random.uniform(area[0][0], area[1][0]), np.random.uniform(area[0][1], area[1][1]), np.random.uniform(area[0][2], area[1][2])]
-                drone = Drone(id=i, camp=self.camp, mu=mu, sigma=self.sigma, R=self.R[i])
-                self.drones.append(drone)
+                self.positions[i] = np.random.multivariate_normal(mu, self.sigma)
+        self.drones = Views(self, Drone, np.arange(self.num))
         if self.camp == "Interceptor":
             self.G0 = self.ConstructGraph()
 
@@ -51,52 +128,71 @@ class Swarm:
         return prt
 
     def ConstructGraph(self):
-        G = [[0 for i in range(self.num)] for j in range(self.num)]
-        for i in range(self.num):
-            G[i][i] = 1
-            for j in range(self.num):
-                d = np.linalg.norm(self.drones[i].position - self.drones[j].position)
-                if d < self.R[i]:
-                    G[i][j] = 1
-        return G
+        return AdjacencyMatrix(self.positions, self.R)
 
 
 class Unit(Drone):
-    def __init__(self, drone, id, category=""):
-        self.parent_id = drone.id
-        self.camp = drone.camp
-        self.R = drone.R
-        # self.mu = drone.mu
-        # self.sigma = drone.sigma
-        self.position = drone.position
-        self.id = id
-        self.NWL = list()
-        self.NTL = list()
-        self.NTL_central  = list()
-        if drone.camp == "Interceptor":
-            self.category = "Worker"
-        elif drone.camp == "Hostile":
-            self.category = "Task"
-        self.cohesion = 0.
+    """Unit id of a List; several units may share one parent drone."""
+    __slots__ = ()
+
+    @property
+    def parent_id(self):
+        return int(self.owner.parent_ids[self.index])
+
+    @property
+    def category(self):
+        return self.owner.category
+
+    @property
+    def cohesion(self):
+        return self.owner.cohesion[self.index]
+
+    @cohesion.setter
+    def cohesion(self, value):
+        self.owner.cohesion[self.index] = value
+
+    @property
+    def NWL(self):
+        return [{"id": int(j)} for j in self.owner.Neighbors(self.index)]
+
+    @property
+    def NTL(self):
+        return [TaskEntry(self.owner, self.index, int(j)) for j in self.owner.TaskNeighbors(self.index)]
+
+    @property
+    def NTL_central(self):
+        return [TaskEntry(self.owner, self.index, int(j)) for j in self.owner.TaskNeighbors(self.index, central=True)]
 
 
 class List(Swarm):
-    def __init__(self, swarm, category=""):
+    """Working list of units, unit k copies drone parent_ids[k] of swarm.
+
+    Per-unit data are arrays indexed by unit id (positions, R, parent_ids,
+    cohesion, neighbor lists in CSR form); units lists them in the current
+    order and id_map by id.
+    """
+
+    def __init__(self, swarm, category="", parent_ids=None):
         # base
         self.parent_num = swarm.num
         self.camp = swarm.camp
         self.area = swarm.area
         self.sigma = swarm.sigma
-        self.R = swarm.R
         self.drones = swarm.drones
         if self.camp == "Interceptor":
             self.G0 = swarm.G0
 
         self.category = category
-        self.units = list()
-        self.id_map = dict()
-        self.num = 0
+        self.parent_ids = np.arange(swarm.num) if parent_ids is None else np.asarray(parent_ids, dtype=np.intp)
+        self.num = len(self.parent_ids)
+        self.positions = swarm.positions[self.parent_ids]
+        self.R = swarm.R[self.parent_ids]
+        self.cohesion = np.zeros(self.num)
+        self.order = np.arange(self.num)
+        self.units = Views(self, Unit, self.order)
+        self.id_map = Views(self, Unit, np.arange(self.num))
         self.center = np.array([0., 0., 0.])
+        self.payoff = None
 
     def __str__(self):
         prt = "List: {}\n".format(self.category)
@@ -105,31 +201,35 @@ class List(Swarm):
         prt += "\n"
         return prt
 
-    def ConstructGraph(self):
-        self.R = [0 for i in range(self.num)]
-        for i in range(self.num):
-            self.R[i] = self.units[i].R
-
-        G = [[0 for i in range(self.num)] for j in range(self.num)]
-        for i in range(self.num):
-            G[i][i] = 1
-            for j in range(self.num):
-                d = np.linalg.norm(self.units[i].position - self.units[j].position)
-                if d < self.R[i]:
-                    G[i][j] = 1
-            # # check isolate dot
-            # cnt = 0
-            # for j in range(self.num):
-            #     if G[i][j] == 1:
-            #         cnt += 1
-            #         break
-            # if cnt <= 2:    # isolate
-            #     for j in range(self.num):
-            #         d = np.linalg.norm(self.units[i].position - self.units[j].position)
-            #         if d < 1.1*self.R:
-            #             G[i][j] = G[j][i] = 1
+    def ConstructGraph(self, G=None):
+        # G: adjacency computed beforehand (see batch.py)
+        if G is None:
+            G = AdjacencyMatrix(self.positions, self.R)
+        # # check isolate dot
+        # for i in range(self.num):
+        #     cnt = 0
+        #     for j in range(self.num):
+        #         if G[i][j] == 1:
+        #             cnt += 1
+        #             break
+        #     if cnt <= 2:    # isolate
+        #         for j in range(self.num):
+        #             d = np.linalg.norm(self.units[i].position - self.units[j].position)
+        #             if d < 1.1*self.R:
+        #                 G[i][j] = G[j][i] = 1
         self.G = G
+        self.G_indptr, self.G_indices = NeighborCSR(G)
         return G
 
+    def Neighbors(self, i):
+        # ids j with G[i][j], ascending
+        return self.G_indices[self.G_indptr[i]:self.G_indptr[i + 1]]
+
+    def TaskNeighbors(self, i, central=False):
+        # task ids in the NTL (or NTL_central) of unit i, ascending
+        if central:
+            return self.NTL_central_indices[self.NTL_central_indptr[i]:self.NTL_central_indptr[i + 1]]
+        return self.NTL_indices[self.NTL_indptr[i]:self.NTL_indptr[i + 1]]
+
     def getPositionsList(self):
-        return [u.position for u in self.units]
\ No newline at end of file
+        return self.positions[self.order]
@@ -0,0 +1,37 @@
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from cache import ResultCache, SolverKey
+
+# python -m pytest Graphical/test_cache.py  or  python test_cache.py
+
+
+class TestSolverKey(unittest.TestCase):
+    def test_default_options_keep_the_label(self):
+        self.assertEqual(SolverKey("gg", None, None, None), "gg")
+
+    def test_long_arrays_differing_in_the_middle(self):
+        # str() of both arrays is the same abbreviated "[1. 1. 1. ... 1. 1. 1.]"
+        a, b = np.ones(2000), np.ones(2000)
+        b[1000] = 2.
+        self.assertEqual(str(a), str(b))
+        self.assertNotEqual(SolverKey("gg", a, None, None), SolverKey("gg", b, None, None))
+        self.assertEqual(SolverKey("gg", a, None, None), SolverKey("gg", a.copy(), None, None))
+
+    def test_cache_separates_options(self):
+        cache = ResultCache(8, 0.05)
+        P, R, S = np.zeros((2, 3)), np.ones(2), np.ones((2, 3))
+        a, b = np.ones(2000), np.ones(2000)
+        b[1000] = 2.
+        cache.Put(P, R, S, [0, 1], SolverKey("gg", a, 0.985, None))
+        self.assertEqual(cache.Get(P, R, S, SolverKey("gg", a, 0.985, None)).tolist(), [0, 1])
+        self.assertIsNone(cache.Get(P, R, S, SolverKey("gg", b, 0.985, None)))
+        self.assertIsNone(cache.Get(P, R, S, SolverKey("gg", a, 0.9975, None)))
+        self.assertIsNone(cache.Get(P, R, S, "gg"))
+
+
+if __name__ == "__main__":
+    unittest.main()
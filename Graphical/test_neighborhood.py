@@ -0,0 +1,61 @@
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from swarms import Swarm
+from algorithm import Algorithm, COS_CENTRAL, COS_VIEW
+
+# python -m pytest Graphical/test_neighborhood.py  or  python test_neighborhood.py
+
+
+def Neighborhood(workers, tasks, **limits):
+    # NTL and NTL_central task ids of every worker drone (units copying the
+    # same drone share its lists)
+    workers, tasks = np.array(workers, dtype=float), np.array(tasks, dtype=float)
+    IS = Swarm(len(workers), camp="Interceptor", swarm_pos=workers, R=np.full(len(workers), 50.))
+    HS = Swarm(len(tasks), camp="Hostile", swarm_pos=tasks, R=np.full(len(tasks), 50.))
+    algs = Algorithm()
+    TL, WL = algs.ConstructList(HS, IS)
+    WL.ConstructGraph()
+    algs.GetNeighborhood(TL, WL, **limits)
+    ntl = [set() for w in workers]
+    central = [set() for w in workers]
+    for i in range(WL.num):
+        d = WL.parent_ids[i]
+        ntl[d] |= set(TL.parent_ids[WL.NTL_indices[WL.NTL_indptr[i]:WL.NTL_indptr[i + 1]]])
+        central[d] |= set(TL.parent_ids[WL.NTL_central_indices[WL.NTL_central_indptr[i]:WL.NTL_central_indptr[i + 1]]])
+    return ntl, central
+
+
+class TestGetNeighborhood(unittest.TestCase):
+    # two workers next to the x axis and tasks symmetric about it, so the
+    # swarm direction is +x: task 0 straight ahead, tasks 1 and 2 about 4.6
+    # deg off the axis (inside the view cone, outside the central cone),
+    # tasks 3 and 4 at 45 deg, task 5 straight ahead but far away
+    workers = [[0, -0.5, 0], [0, 0.5, 0]]
+    tasks = [[100, 0, 0], [100, 8, 0], [100, -8, 0], [100, 100, 0], [100, -100, 0], [1000, 0, 0]]
+
+    def test_no_limits_keeps_every_task(self):
+        ntl, central = Neighborhood(self.workers, self.tasks)
+        self.assertEqual(ntl, [set(range(6))] * 2)
+        self.assertEqual(central, [set(range(6))] * 2)
+
+    def test_out_of_cone_task_is_excluded(self):
+        ntl, central = Neighborhood(self.workers, self.tasks, cos_central=COS_CENTRAL, cos_view=COS_VIEW)
+        self.assertEqual(ntl, [{0, 1, 2, 5}] * 2)
+        self.assertEqual(central, [{0, 5}] * 2)
+
+    def test_out_of_range_task_is_excluded(self):
+        ntl, central = Neighborhood(self.workers, self.tasks, view_R=500.)
+        self.assertEqual(ntl, [{0, 1, 2, 3, 4}] * 2)
+        self.assertEqual(central, [{0, 1, 2, 3, 4}] * 2)
+
+    def test_range_per_worker(self):
+        ntl, _ = Neighborhood(self.workers, self.tasks, view_R=[120., 2000.])
+        self.assertEqual(ntl, [{0, 1, 2}, set(range(6))])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from wire import EncodeRequest, DecodeRequest, DecodeReply, WireError
+import main_UDP
+
+# python -m pytest Graphical/test_wire.py  or  python test_wire.py
+
+
+class TestWireRoundTrip(unittest.TestCase):
+    def Solve(self, workers, tasks, **kw):
+        seq, p_next = DecodeReply(main_UDP.SolveRequest(EncodeRequest(workers, tasks, seq=7, **kw)))
+        self.assertEqual(seq, 7)
+        self.assertEqual(len(p_next), len(workers))
+        return p_next
+
+    def test_more_tasks_than_workers(self):
+        # every worker sits next to one task, the other tasks are far away
+        workers = [[0, 0, 0], [50, 0, 0], [100, 0, 0]]
+        tasks = [[300, 300, 0], [101, 0, 0], [400, 0, 300], [1, 0, 0], [0, 400, 0], [51, 0, 0], [200, 200, 200], [-300, 0, 0]]
+        self.assertEqual(self.Solve(workers, tasks).tolist(), [3, 5, 1])
+
+    def test_more_workers_than_tasks(self):
+        workers = [[0, 0, 0], [100, 0, 0], [1, 0, 0], [101, 0, 0]]
+        tasks = [[102, 0, 10], [-1, 0, 10]]
+        self.assertEqual(self.Solve(workers, tasks).tolist(), [1, 0, 1, 0])
+
+    def test_task_ids(self):
+        workers = [[0, 0, 0], [50, 0, 0]]
+        tasks = [[300, 300, 0], [51, 0, 0], [1, 0, 0]]
+        p_next = self.Solve(workers, tasks, worker_ids=[4, 9], task_ids=[20, 21, 22])
+        self.assertEqual(p_next.tolist(), [22, 21])
+
+    def test_empty_request_is_rejected(self):
+        with self.assertRaises(WireError):
+            DecodeRequest(EncodeRequest(np.zeros((0, 3)), [[1, 2, 3]]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+import numpy as np
+
+from wire import EncodeRequest, DecodeReply
+from batch import RandomScenarios
+
+# Load generator for the allocation server (python main_UDP.py).
+# python udp_load.py --workers 10 20 50 --tasks 5 10 --rate 50 --clients 4 --duration 5
+# python udp_load.py --record scenarios.npz ...   # npz with workers B x N x 3, tasks B x M x 3[, radii B x N]
+# python udp_load.py ... --budget 10              # exit 1 if a p99 round trip exceeds 10 ms
+# Every client sends at --rate requests/s from its own socket; replies are
+# matched by sequence number, anything unanswered --timeout s after the
+# last send counts as lost (the server also drops stale requests of a busy
+# client, see udp_server.py).
+
+PERCENTILES = [50, 95, 99, 100]
+
+
+class LoadClient(asyncio.DatagramProtocol):
+    def __init__(self):
+        self.transport = None
+        self.sent = dict()
+        self.rtt = list()
+        self.errors = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        now = time.perf_counter()
+        try:
+            seq, _ = DecodeReply(data)
+        except Exception:
+            self.errors += 1
+            return
+        start = self.sent.pop(seq, None)
+        if start is not None:
+            self.rtt.append((now - start) * 1000)
+
+
+async def RunConfig(host, port, scenarios, rate, clients, duration, timeout):
+    loop = asyncio.get_running_loop()
+    workers, tasks, radii = scenarios
+    endpoints = [await loop.create_datagram_endpoint(LoadClient, remote_addr=(host, port)) for k in range(clients)]
+    end = loop.time() + duration
+
+    async def Drive(k, transport, client):
+        seq, i, due = 0, k, loop.time()
+        while loop.time() < end:
+            b = i % len(workers)
+            packet = EncodeRequest(workers[b], tasks[b], seq=seq, radii=radii[b])
+            client.sent[seq] = time.perf_counter()
+            transport.sendto(packet)
+            seq, i = seq + 1, i + clients
+            due += 1. / rate
+            await asyncio.sleep(max(0., due - loop.time()))
+        return seq
+
+    start = time.perf_counter()
+    sent = sum(await asyncio.gather(*[Drive(k, t, c) for k, (t, c) in enumerate(endpoints)]))
+    await asyncio.sleep(timeout)
+    elapsed = time.perf_counter() - start
+    rtt = [x for t, c in endpoints for x in c.rtt]
+    for t, c in endpoints:
+        t.close()
+
+    row = {"workers": workers.shape[1], "tasks": tasks.shape[1], "clients": clients, "rate": rate,
+           "sent": sent, "received": len(rtt), "loss": 100. * (sent - len(rtt)) / max(sent, 1),
+           "throughput": len(rtt) / (elapsed - timeout)}
+    v = np.percentile(rtt, PERCENTILES) if rtt else [np.nan] * len(PERCENTILES)
+    row.update({("max" if p == 100 else "p{}".format(p)): float(x) for p, x in zip(PERCENTILES, v)})
+    return row
+
+
+def Main(argv=None):
+    parser = argparse.ArgumentParser(description="Latency and throughput of the allocation server")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=9797)
+    parser.add_argument("--workers", type=int, nargs="+", default=[10, 20, 50])
+    parser.add_argument("--tasks", type=int, nargs="+", default=[5, 10])
+    parser.add_argument("--radius", type=float, default=50.)
+    parser.add_argument("--record", help="replay scenarios from an npz file instead of random ones")
+    parser.add_argument("--scenarios", type=int, default=100, help="random scenarios per config")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rate", type=float, default=20., help="requests/s per client")
+    parser.add_argument("--clients", type=int, default=1)
+    parser.add_argument("--duration", type=float, default=5.)
+    parser.add_argument("--timeout", type=float, default=1.)
+    parser.add_argument("--out", help="write the results as json")
+    parser.add_argument("--budget", type=float, help="p99 round trip budget in ms")
+    args = parser.parse_args(argv)
+
+    if args.record:
+        data = np.load(args.record)
+        workers, tasks = data["workers"], data["tasks"]
+        radii = data["radii"] if "radii" in data else np.full(workers.shape[:2], args.radius)
+        configs = [(workers, tasks, radii)]
+    else:
+        configs = [RandomScenarios(args.scenarios, N, M, seed=args.seed, R=args.radius)
+                   for N in args.workers for M in args.tasks]
+
+    print("{:>7} {:>5} {:>9} {:>9} {:>9} {:>9} {:>7} {:>9}".format(
+        "workers", "tasks", "p50", "p95", "p99", "max", "loss", "req/s"))
+    rows, failed = list(), list()
+    for scenarios in configs:
+        row = asyncio.run(RunConfig(args.host, args.port, scenarios, args.rate, args.clients, args.duration, args.timeout))
+        rows.append(row)
+        print("{:>7} {:>5} {:>7.2f}ms {:>7.2f}ms {:>7.2f}ms {:>7.2f}ms {:>6.1f}% {:>9.1f}".format(
+            row["workers"], row["tasks"], row["p50"], row["p95"], row["p99"], row["max"], row["loss"], row["throughput"]))
+        if args.budget is not None and not row["p99"] <= args.budget:
+            failed.append(row)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"args": vars(args), "results": rows}, f, indent=2)
+    for row in failed:
+        print("over budget: p99 {:.2f}ms > {:.2f}ms (workers={}, tasks={})".format(row["p99"], args.budget, row["workers"], row["tasks"]))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(Main())
@@ -0,0 +1,90 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class AllocationServer(asyncio.DatagramProtocol):
+    """Asyncio UDP front end that runs solve(request bytes) -> reply bytes in a pool.
+
+    Every client (sender address) has at most one solve in flight. Requests
+    that arrive meanwhile are coalesced: only the newest is kept and solved
+    next, older ones are dropped as stale. Replies go back to the sender,
+    or to its host at reply_port when the client listens on a fixed port.
+    """
+
+    def __init__(self, solve, executor, reply_port=None):
+        self.solve = solve
+        self.executor = executor
+        self.reply_port = reply_port
+        self.transport = None
+        self.busy = set()
+        self.pending = dict()
+        self.received = 0
+        self.solved = 0
+        self.coalesced = 0
+        self.failed = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        self.received += 1
+        if addr in self.busy:
+            if addr in self.pending:
+                self.coalesced += 1
+            self.pending[addr] = data
+            return
+        self.busy.add(addr)
+        asyncio.ensure_future(self.Handle(addr, data))
+
+    async def Handle(self, addr, data):
+        loop = asyncio.get_running_loop()
+        dest = addr if self.reply_port is None else (addr[0], self.reply_port)
+        try:
+            while data is not None:
+                try:
+                    reply = await loop.run_in_executor(self.executor, self.solve, data)
+                except Exception as e:
+                    self.failed += 1
+                    print("request from {} failed: {!r}".format(addr, e))
+                else:
+                    self.solved += 1
+                    if reply is not None and self.transport is not None:
+                        self.transport.sendto(reply, dest)
+                data = self.pending.pop(addr, None)
+        finally:
+            self.busy.discard(addr)
+
+    def Stats(self):
+        return {"received": self.received, "solved": self.solved, "coalesced": self.coalesced,
+                "failed": self.failed, "clients": len(self.busy)}
+
+
+def MakeExecutor(workers=None, threads=False, initializer=None, initargs=()):
+    # initializer(*initargs) runs once in every worker (once in total for threads)
+    if threads:
+        if initializer is not None:
+            initializer(*initargs)
+        return ThreadPoolExecutor(workers)
+    return ProcessPoolExecutor(workers, initializer=initializer, initargs=initargs)
+
+
+async def ServeAsync(solve, host="localhost", port=9797, workers=None, threads=False, reply_port=None, report=0,
+                     initializer=None, initargs=()):
+    loop = asyncio.get_running_loop()
+    with MakeExecutor(workers, threads, initializer, initargs) as executor:
+        transport, server = await loop.create_datagram_endpoint(
+            lambda: AllocationServer(solve, executor, reply_port), local_addr=(host, port))
+        try:
+            while True:
+                await asyncio.sleep(report or 3600)
+                if report:
+                    print("udp server: {}".format(server.Stats()))
+        finally:
+            transport.close()
+
+
+def Serve(solve, **kwargs):
+    try:
+        asyncio.run(ServeAsync(solve, **kwargs))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,129 @@
+import struct
+import numpy as np
+
+# UDP allocation protocol.
+#
+# header, little endian, 16 bytes:
+#   magic "GTAP" | version u8 | flags u8 | reserved u16 | seq u32 | N u16 | M u16
+# request payload:
+#   workers N x 3, tasks M x 3 (float64, float32 with FLOAT32)
+#   [radii N (same float type), with RADII]
+#   [worker ids N int32, task ids M int32, with IDS]
+# reply payload (N = workers, M = 0):
+#   N int32, the task of every worker (task id with IDS, else task index)
+#
+# The legacy request, 450 float64 (100 worker rows then 50 task rows, lists
+# end at the first all-zero row), is still accepted and answered with 100
+# float64 as before.
+
+MAGIC = b"GTAP"
+VERSION = 1
+FLOAT32 = 1
+RADII = 2
+IDS = 4
+HEADER = struct.Struct("<4sBBHIHH")
+LEGACY_SIZE = 450 * 8
+
+
+class WireError(ValueError):
+    pass
+
+
+class Request:
+    __slots__ = ("seq", "flags", "workers", "tasks", "radii", "worker_ids", "task_ids", "legacy")
+
+    def __init__(self, seq, flags, workers, tasks, radii=None, worker_ids=None, task_ids=None, legacy=False):
+        self.seq = seq
+        self.flags = flags
+        self.workers = workers
+        self.tasks = tasks
+        self.radii = radii
+        self.worker_ids = worker_ids
+        self.task_ids = task_ids
+        self.legacy = legacy
+
+
+def EncodeRequest(workers, tasks, seq=0, radii=None, worker_ids=None, task_ids=None, dtype=np.float64):
+    workers = np.asarray(workers).reshape(-1, 3)
+    tasks = np.asarray(tasks).reshape(-1, 3)
+    dtype = np.dtype(dtype).newbyteorder("<")
+    flags = FLOAT32 if dtype.itemsize == 4 else 0
+    parts = [workers.astype(dtype).tobytes(), tasks.astype(dtype).tobytes()]
+    if radii is not None:
+        flags |= RADII
+        parts.append(np.broadcast_to(np.asarray(radii, dtype=dtype), (len(workers),)).tobytes())
+    if worker_ids is not None or task_ids is not None:
+        flags |= IDS
+        worker_ids = np.arange(len(workers)) if worker_ids is None else worker_ids
+        task_ids = np.arange(len(tasks)) if task_ids is None else task_ids
+        parts.append(np.asarray(worker_ids, dtype="<i4").tobytes())
+        parts.append(np.asarray(task_ids, dtype="<i4").tobytes())
+    header = HEADER.pack(MAGIC, VERSION, flags, 0, seq & 0xffffffff, len(workers), len(tasks))
+    return header + b"".join(parts)
+
+
+def Leading(rows):
+    # rows before the first all-zero row
+    nonzero = np.any(rows, axis=1)
+    return rows[:len(rows) if nonzero.all() else int(np.argmin(nonzero))]
+
+
+def DecodeLegacy(data):
+    data_np = np.frombuffer(data, dtype="=f8").reshape(150, 3)
+    return Request(0, 0, Leading(data_np[:100]), Leading(data_np[100:]), legacy=True)
+
+
+def DecodeRequest(data):
+    """Request from a datagram; arrays are read-only views of data."""
+    if len(data) >= HEADER.size and data[:4] == MAGIC:
+        magic, version, flags, _, seq, N, M = HEADER.unpack_from(data)
+        if version != VERSION:
+            raise WireError("unsupported version {}".format(version))
+        if N == 0 or M == 0:
+            raise WireError("request without workers or tasks ({} x {})".format(N, M))
+        dtype = np.dtype("<f4" if flags & FLOAT32 else "<f8")
+        size = HEADER.size + (3 * (N + M) + (N if flags & RADII else 0)) * dtype.itemsize + (4 * (N + M) if flags & IDS else 0)
+        if len(data) != size:
+            raise WireError("expected {} bytes, got {}".format(size, len(data)))
+        offset = HEADER.size
+
+        def Take(dt, count):
+            nonlocal offset
+            a = np.frombuffer(data, dtype=dt, count=count, offset=offset)
+            offset += count * np.dtype(dt).itemsize
+            return a
+
+        workers = Take(dtype, 3 * N).reshape(N, 3)
+        tasks = Take(dtype, 3 * M).reshape(M, 3)
+        radii = Take(dtype, N) if flags & RADII else None
+        worker_ids = task_ids = None
+        if flags & IDS:
+            worker_ids = Take("<i4", N)
+            task_ids = Take("<i4", M)
+        return Request(seq, flags, workers, tasks, radii, worker_ids, task_ids)
+    if len(data) == LEGACY_SIZE:
+        request = DecodeLegacy(data)
+        if len(request.workers) == 0 or len(request.tasks) == 0:
+            raise WireError("request without workers or tasks ({} x {})".format(len(request.workers), len(request.tasks)))
+        return request
+    raise WireError("unknown request of {} bytes".format(len(data)))
+
+
+def EncodeReply(request, p_next):
+    p_next = np.asarray(p_next, dtype=int)
+    if request.legacy:
+        p_next_zeros = np.zeros(100)
+        p_next_zeros[:len(p_next)] = p_next
+        return p_next_zeros.astype("=f8").tobytes()
+    if request.task_ids is not None:
+        p_next = request.task_ids[p_next]
+    header = HEADER.pack(MAGIC, VERSION, request.flags & IDS, 0, request.seq, len(p_next), 0)
+    return header + p_next.astype("<i4").tobytes()
+
+
+def DecodeReply(data):
+    # (seq, task of every worker) of a reply, seq is None for the legacy layout
+    if data[:4] == MAGIC:
+        magic, version, flags, _, seq, N, M = HEADER.unpack_from(data)
+        return seq, np.frombuffer(data, dtype="<i4", count=N, offset=HEADER.size)
+    return None, np.frombuffer(data, dtype="=f8").astype(int)
@@ -15,15 +15,11 @@ from nav_msgs.msg import Odometry
 
 import time
 import numpy as np
-import threading
 from collections import OrderedDict
 
 
-from utils import constrain_rad,eulerAngleToMatrix
-
-# 结束线程的函数
-import inspect
-import ctypes
+from utils import constrain_rad,eulerAngleToMatrix,Attitude
+from scheduler import PeriodicScheduler
 
 
 PX4_CTRL_DICT = {
@@ -45,15 +41,14 @@ class Px4Controller:
 
         self.command_vel = construct_vel_target()
 
-        self.mav_roll = None
-        self.mav_pitch = None
-        self.mav_yaw = None
+        # 姿态, mav_roll/mav_pitch/mav_yaw在收到第一帧位姿之前为None
+        self.attitude = Attitude()
+        self.R_be = self.attitude.R
 
         # R_eo是odom系到ENU系的旋转矩阵   
         self.mav_yaw_offset = 0
         self.R_eo = np.identity(3)
-        
-        self.mav_yaw_odom = None
+
 
         # 相对于起飞点的enu位置
         self.pos_enu = None
@@ -89,6 +84,10 @@ class Px4Controller:
         self.setpt_att_pub =  rospy.Publisher('/mavros/setpoint_raw/attitude', AttitudeTarget, queue_size=10)
         self.mav_sw_pos_pub =  rospy.Publisher('/bs_swarm_pos/mav_pos', PointStamped, queue_size=10)
 
+        # 定频推送, 一个线程按单调时钟的截止时间调度, 推到ROS关闭为止(降落指令在主程序结束后也要一直推)
+        self.pub_rate = rospy.get_param('~setpoint_rate', 50.0)
+        self.pub_scheduler = PeriodicScheduler("px4_pub")
+
         
         '''
         ros subscribers
@@ -111,51 +110,44 @@ class Px4Controller:
 
     # ============================== ROS 推送相关 start ============================================
           
-    def mavros_pub_loop(self):
-        pub_time = time.time()
-        while (not rospy.is_shutdown()):
-            if (time.time() - pub_time) > 1/50.0:
-                pub_time = time.time()
-                if self.mavros_vel_ctrl:
-                    self.setpt_pva_pub.publish(self.command_vel)
-                if self.mavros_att_ctrl:
-                    self.setpt_att_pub.publish(self.command_att)
-            time.sleep(0.01)
-                
-        self.stop_thread(self.mavros_pub_th)
-
-
-    def swarm_pos_loop(self):
-        pub_time = time.time()
-        while (not rospy.is_shutdown()):
-            if (time.time() - pub_time) > 1/50.0:
-                pub_time = time.time()
-                mav_sw_pos = PointStamped()
-                mav_sw_pos.point.x = self.pos_swarm[0]
-                mav_sw_pos.point.y = self.pos_swarm[1]
-                mav_sw_pos.point.z = self.pos_swarm[2]
-                self.mav_sw_pos_pub.publish(mav_sw_pos)
-            time.sleep(0.01)
-                
-        self.stop_thread(self.mavros_pub_th)
+    def mavros_pub_once(self):
+        if self.mavros_vel_ctrl:
+            self.setpt_pva_pub.publish(self.command_vel)
+        if self.mavros_att_ctrl:
+            self.setpt_att_pub.publish(self.command_att)
+
+
+    def swarm_pos_once(self):
+        mav_sw_pos = PointStamped()
+        mav_sw_pos.point.x = self.pos_swarm[0]
+        mav_sw_pos.point.y = self.pos_swarm[1]
+        mav_sw_pos.point.z = self.pos_swarm[2]
+        self.mav_sw_pos_pub.publish(mav_sw_pos)
 
 
     def start_pub(self):
         self.controller_swith(ctrl_type="vel")
-        self.mavros_pub_th = threading.Thread(target=self.mavros_pub_loop, args=())
-        self.mavros_pub_th.start()
-
-        self.swarm_pos_th = threading.Thread(target=self.swarm_pos_loop, args=())
-        self.swarm_pos_th.start()
+        self.pub_scheduler.add("mavros_setpoint", self.mavros_pub_once, self.pub_rate)
+        self.pub_scheduler.add("swarm_pos", self.swarm_pos_once, self.pub_rate)
+        self.pub_scheduler.start()
+        rospy.on_shutdown(self.stop_pub)
 
         time.sleep(1)
         print("start pub threading")
 
 
-    def stop_thread(self, thread_id):
-        _async_raise(thread_id, SystemExit)
-        time.sleep(1)
-        print("a thread  is dead")
+    def stop_pub(self):
+        if not self.pub_scheduler.stop():
+            print("pub thread did not stop")
+        self.print_pub_stats()
+
+
+    def print_pub_stats(self):
+        # 推送的抖动(实际推送时刻-截止时间)和超时(错过周期)统计
+        for name, st in self.pub_scheduler.stats().items():
+            print("{}: {} sent at {:.0f}Hz, jitter mean {:.2f}ms p99 {:.2f}ms max {:.2f}ms, overruns {} (skipped {}), errors {}".format(
+                name, st["count"], st["rate"], st["jitter_mean_ms"], st["jitter_p99_ms"], st["jitter_max_ms"],
+                st["overruns"], st["skipped"], st["errors"]))
     # ============================== ROS 推送相关 end ============================================
     
 
@@ -176,16 +168,9 @@ class Px4Controller:
         self.pos_swarm = self.pos_odom + self.pos_swarm_init
 
 
-        q0, q1, q2, q3 = msg.pose.orientation.w, msg.pose.orientation.x, msg.pose.orientation.y, msg.pose.orientation.z
-        
-        self.quat = np.array([q0, q1, q2, q3])
-        self.mav_yaw = np.arctan2(2*(q0*q3 + q1*q2), 1-2*(q2*q2 + q3*q3))
-        self.mav_yaw_odom = constrain_rad(self.mav_yaw - self.mav_yaw_offset)
-
-        self.mav_roll = np.arctan2(2*(q0*q1 + q2*q3), 1-2*(q1*q1 + q2*q2))
-        self.mav_pitch = np.arcsin(2*(q0*q2 - q3*q1))
-
-        self.R_be = eulerAngleToMatrix([self.mav_roll,self.mav_pitch,self.mav_yaw])
+        # R_be直接由四元数得到, 欧拉角用到时才算
+        q = msg.pose.orientation
+        self.R_be = self.attitude.update(q.w, q.x, q.y, q.z)
 
 
     def local_vel_callback(self, msg):
@@ -241,6 +226,30 @@ class Px4Controller:
 
 
 
+    # ============================== 姿态 start ============================================
+    @property
+    def quat(self):
+        return np.array(self.attitude.quat)
+
+    @property
+    def mav_roll(self):
+        return self.attitude.roll if self.attitude.valid else None
+
+    @property
+    def mav_pitch(self):
+        return self.attitude.pitch if self.attitude.valid else None
+
+    @property
+    def mav_yaw(self):
+        return self.attitude.yaw if self.attitude.valid else None
+
+    @property
+    def mav_yaw_odom(self):
+        return constrain_rad(self.mav_yaw - self.mav_yaw_offset) if self.attitude.valid else None
+    # ============================== 姿态 end ============================================
+
+
+
     # ============================== PX4 起飞降落解锁控制接口 start ============================================  
     @property
     def task_ready(self):
@@ -520,18 +529,6 @@ def construct_pos_target(x=0, y=0, z=0, yaw=0, yaw_rate=0, frame="FLU"):
     target_raw_pose.yaw_rate = yaw_rate
     return target_raw_pose
 
-# 用于结束线程的函数
-def _async_raise(tid, exctype):
-    
-    if not inspect.isclass(exctype):
-        raise TypeError("Only types can be raised (not instances)")
-    res = ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_long(tid), ctypes.py_object(exctype))
-    if res == 0:
-        raise ValueError("invalid thread id")
-    elif res != 1:
-        ctypes.pythonapi.PyThreadState_SetAsyncExc(tid, None)
-        raise SystemError("PyThreadState_SetAsyncExc failed")   
-
 
 if __name__ == '__main__':
     con = Px4Controller()
@@ -4,11 +4,15 @@
 
 import rospy
 from geometry_msgs.msg import Point, PoseStamped 
+from std_msgs.msg import String
 
 
 import io
 import os
 import time
+import json
+import socket
+import threading
 
 
 
@@ -25,6 +29,11 @@ import sys
 __BASE__ = os.path.dirname(os.path.dirname(file_pwd))
 sys.path.append(__BASE__+"/Graphical")
 from main_ly import useGTA
+from incremental import IncrementalAllocator
+from metrics import Metrics, FileSink, Stage
+from cache import ResultCache
+
+from pose_store import PoseStore
 
 
 class Allocation:
@@ -34,12 +43,77 @@ class Allocation:
         self.mav_id = mav_id
         self.mav_posL = np.zeros((self.mav_num,2))
 
-        self.last_mav_num = 0
-        self.last_circle_num = 0
-
         self.circle_posL = np.zeros((self.mav_num,2))
-        self.Pcur = np.zeros((self.mav_num,3))
-        self.p_search = np.zeros((self.mav_num,3))
+        # latest mocap positions and update times, shared with the task threads;
+        # a slot counts while it is fresher than ~stale_timeout
+        self.mav_store = PoseStore(self.mav_num)
+        self.circle_store = PoseStore(self.mav_num)
+        self.stale_timeout = rospy.get_param('~stale_timeout', 0.5)
+        # reallocate on mocap updates when the set of fresh slots changes or (if > 0) a
+        # position drifted more than ~drift_threshold since the last allocation, at
+        # most once per ~min_interval
+        self.min_interval = rospy.get_param('~min_interval', 0.1)
+        self.drift_threshold = rospy.get_param('~drift_threshold', 0.0)
+        self.allocate_lock = threading.Lock()
+        self.last_time = -np.inf
+        self.last_mav_mask = np.zeros(self.mav_num, dtype=bool)
+        self.last_circle_mask = np.zeros(self.mav_num, dtype=bool)
+        self.last_Pcur = np.zeros((0,3))
+        self.last_p_search = np.zeros((0,3))
+
+        # reallocate on every update with the stateful allocator instead of only on changes
+        self.incremental = rospy.get_param('~incremental_allocation', False)
+        self.allocator = IncrementalAllocator(M=500, threshold=0.05)
+
+        self.target_pos_pub =  rospy.Publisher('/allocation/target_pos', Point, queue_size=1)
+
+        # ~allocation_mode "shared": only the fresh drone with the lowest id solves and
+        # sends the whole assignment, repeated every ~assignment_period; the others adopt
+        # it and solve locally only when no assignment covering them arrived for
+        # ~assignment_timeout.
+        # ~assignment_transport "udp" broadcasts it to ~assignment_address:~assignment_port,
+        # which works with one roscore per drone (_scripts/swarm_startup.sh); "topic" uses
+        # /allocation/assignment and needs all drones on one ROS master
+        self.shared = rospy.get_param('~allocation_mode', 'local') == 'shared'
+        self.assignment_transport = rospy.get_param('~assignment_transport', 'udp')
+        self.assignment_period = rospy.get_param('~assignment_period', 0.5)
+        self.assignment_timeout = rospy.get_param('~assignment_timeout', 1.0)
+        self.assignment_seq = 0
+        self.assignment = None
+        self.assignment_time = -np.inf
+        self.published_time = -np.inf
+        self.source = None
+        self.fallback_warned = False
+        if self.shared and self.assignment_transport == 'udp':
+            self.assignment_address = (rospy.get_param('~assignment_address', '255.255.255.255'), rospy.get_param('~assignment_port', 9799))
+            self.assignment_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            # several drones of a simulation share one host and port
+            self.assignment_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.assignment_sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            self.assignment_sock.bind(('', self.assignment_address[1]))
+            self.assignment_sock.settimeout(1.0)
+            self.assignment_thread = threading.Thread(target=self.assignment_recv_loop, name="assignment_recv")
+            self.assignment_thread.daemon = True
+            self.assignment_thread.start()
+        elif self.shared:
+            self.assignment_pub = rospy.Publisher('/allocation/assignment', String, queue_size=1, latch=True)
+            self.assignment_sub = rospy.Subscriber('/allocation/assignment', String, self.assignment_callback)
+
+        # per-stage timings and counters, one JSON record per allocation on /allocation/metrics
+        # (and appended to ~metrics_file if set)
+        self.metrics = None
+        if rospy.get_param('~metrics', False):
+            self.metrics_pub = rospy.Publisher('/allocation/metrics', String, queue_size=10)
+            sinks = [lambda record: self.metrics_pub.publish(String(data=json.dumps(record)))]
+            if rospy.get_param('~metrics_file', ''):
+                sinks.append(FileSink(rospy.get_param('~metrics_file')))
+            self.metrics = Metrics(size=rospy.get_param('~metrics_buffer', 256), sinks=sinks)
+
+        # reuse the last results while positions stay within ~result_cache_tolerance
+        self.cache = None
+        if rospy.get_param('~result_cache_size', 0) > 0:
+            self.cache = ResultCache(rospy.get_param('~result_cache_size'), rospy.get_param('~result_cache_tolerance', 0.05))
+
         self.ros_subL = [
             rospy.Subscriber("/vrpn_client_node/BUAA_{:02d}/pose".format(i+1), PoseStamped, self.mav_pos_callback,(i,))
             for i in range(self.mav_num)    
@@ -48,18 +122,27 @@ class Allocation:
             rospy.Subscriber("/vrpn_client_node/CIRCLE_{:02d}/pose".format(i+1), PoseStamped, self.circle_pos_callback,(i,))
             for i in range(circle_num)
         ]
-        self.timer = rospy.Timer(rospy.Duration(2), self.allocate_callback)
-
-        self.target_pos_pub =  rospy.Publisher('/allocation/target_pos', Point, queue_size=1)
-        
+        # slots only go stale without any callback, so check for that periodically
+        self.timer = rospy.Timer(rospy.Duration(rospy.get_param('~watchdog_period', 0.1)), self.allocate_callback)
     
     def mav_pos_callback(self,msg,i):
         # self.mav_posL[i,:] = msg.pose.position.x, msg.pose.position.y
-        self.Pcur[i,:] = msg.pose.position.x, msg.pose.position.y, msg.pose.position.z
+        self.mav_store.update(i, (msg.pose.position.x, msg.pose.position.y, msg.pose.position.z), rospy.get_time())
+        self.trigger()
 
     def circle_pos_callback(self,msg,i):
         # self.circle_posL[i,:] = msg.pose.position.x, msg.pose.position.y
-        self.p_search[i,:] = msg.pose.position.x, msg.pose.position.y, msg.pose.position.z
+        self.circle_store.update(i, (msg.pose.position.x, msg.pose.position.y, msg.pose.position.z), rospy.get_time())
+        self.trigger()
+
+    @property
+    def Pcur(self):
+        # read-only, see PoseStore
+        return self.mav_store.snapshot().positions
+
+    @property
+    def p_search(self):
+        return self.circle_store.snapshot().positions
     
     def allocate(self,circle_posL):
         print("mav_posL:")
@@ -77,57 +160,177 @@ class Allocation:
         print("p_search:", self.p_search)
         N = max(np.size(self.Pcur, 0), np.size(self.p_search, 0))
         ViewR = np.array([4000 for i in range(N)])
-        p_next = useGTA(self.Pcur, ViewR, self.p_search)
+        p_next = useGTA(self.Pcur, ViewR, self.p_search, cache=self.cache)
         print("p_next:", p_next)
 
         return p_next[self.mav_id-1]
 
-    def allocate_callback(self, event):
-        cnt_zero_line_of_Pcur = 0
-        cnt_zero_line_of_p_search = 0
-        for i in range(self.mav_id-1):
-            if np.all(self.Pcur[i]==0):
-                cnt_zero_line_of_Pcur += 1
-
-        local_to_self_p_search_dic = {}
-        for i in range(self.p_search.shape[0]):
-            local_to_self_p_search_dic[i-cnt_zero_line_of_p_search] = i
-            if np.all(self.p_search[i]==0):
-                cnt_zero_line_of_p_search += 1
-
-        Pcur = self.Pcur[[not np.all(self.Pcur[i]==0) for i in range(self.Pcur.shape[0])], :]
-        p_search = self.p_search[[not np.all(self.p_search[i]==0) for i in range(self.p_search.shape[0])], :]
-
-        # print("Pcur:", Pcur)
-        # print("p_search:", p_search)
-
-        this_mav_num = np.size(Pcur, 0)
-        this_circle_num = np.size(p_search, 0)
-        # event-trigger, only re-allocate when the number of mavs or targets changed.
-        if (this_mav_num != self.last_mav_num) or (this_circle_num != self.last_circle_num):
-            time_start = time.time()
+    def changed(self, mav_mask, circle_mask, Pcur, p_search):
+        if self.incremental:
+            return True
+        # the last target came from a leader that went silent
+        if self.source != "local":
+            return True
+        # event-trigger, re-allocate when mavs or targets appeared or were lost
+        if not (np.array_equal(mav_mask, self.last_mav_mask) and np.array_equal(circle_mask, self.last_circle_mask)):
+            return True
+        if self.drift_threshold > 0:
+            drift = max(np.abs(Pcur - self.last_Pcur).max(initial=0.), np.abs(p_search - self.last_p_search).max(initial=0.))
+            return drift > self.drift_threshold
+        return False
+
+    def trigger(self):
+        # called from every mocap callback and the watchdog; one allocation at a time
+        if not self.allocate_lock.acquire(False):
+            return
+        try:
+            now = rospy.get_time()
+            if now - self.last_time < self.min_interval:
+                return
+            mavs = self.mav_store.snapshot()
+            circles = self.circle_store.snapshot()
+            mav_mask = mavs.fresh(now, self.stale_timeout)
+            circle_mask = circles.fresh(now, self.stale_timeout)
+            is_leader = self.leading(mav_mask)
+            if self.shared and is_leader and now - self.published_time >= self.assignment_period:
+                self.publish_assignment(now)
+            if self.shared and not is_leader:
+                if now - self.assignment_time < self.assignment_timeout:
+                    return
+                if not self.fallback_warned:
+                    self.fallback_warned = True
+                    print("no assignment from the leader for {}s, solving locally (~assignment_transport {})".format(
+                        self.assignment_timeout, self.assignment_transport))
+            Pcur = mavs.positions[mav_mask]
+            p_search = circles.positions[circle_mask]
+            if not self.changed(mav_mask, circle_mask, Pcur, p_search):
+                return
+            self.last_time = now
+            self.last_mav_mask, self.last_circle_mask = mav_mask, circle_mask
+            self.last_Pcur, self.last_p_search = Pcur, p_search
+            if mav_mask[self.mav_id-1] and len(p_search) != 0:
+                self.reallocate(np.flatnonzero(mav_mask), np.flatnonzero(circle_mask), Pcur, p_search)
+        finally:
+            self.allocate_lock.release()
+
+    def reallocate(self, mav_ids, circle_ids, Pcur, p_search):
+        time_start = time.time()
+        if self.incremental:
+            with Stage(self.metrics, "solve"):
+                p_next = self.allocator.Update(Pcur, p_search, mav_ids, circle_ids)
+            if self.metrics is not None:
+                self.metrics.Count("rows_updated", self.allocator.rows_updated)
+                self.metrics.Count("cols_updated", self.allocator.cols_updated)
+                self.metrics.Commit(solver="incremental")
+        else:
             print("Pcur:", Pcur)
             print("p_search:", p_search)
-            N = max(this_mav_num, this_circle_num)
+            N = max(len(Pcur), len(p_search))
             ViewR = np.array([4000 for i in range(N)])
-            p_next = useGTA(Pcur, ViewR, p_search)
+            p_next = useGTA(Pcur, ViewR, p_search, metrics=self.metrics, cache=self.cache)
             print("p_next:", p_next)
 
-            tgt_idx = local_to_self_p_search_dic[p_next[self.mav_id-1-cnt_zero_line_of_Pcur]]
+        targets = circle_ids[p_next]
+        tgt_idx = targets[np.flatnonzero(mav_ids == self.mav_id-1)[0]]
+
+        self.publish_target(tgt_idx, "local")
+        print("target_pos:", p_search[circle_ids == tgt_idx][0])
+        if self.shared and self.leading(np.isin(np.arange(self.mav_num), mav_ids)):
+            self.assignment_seq += 1
+            self.assignment = {"leader": self.mav_id-1, "seq": self.assignment_seq,
+                               "mav_ids": mav_ids.tolist(), "targets": targets.tolist()}
+            self.publish_assignment(rospy.get_time())
+
+        time_end = time.time()
+        if self.incremental:
+            print("Total time: {} ms (rows {} cols {} updated)".format((time_end - time_start) * 1000, self.allocator.rows_updated, self.allocator.cols_updated))
+        else:
+            print("Total time: {} ms".format((time_end - time_start) * 1000))
+
+    def allocate_callback(self, event):
+        self.trigger()
+
+    def leading(self, mav_mask):
+        return np.argmax(mav_mask) == self.mav_id-1 and mav_mask[self.mav_id-1]
+
+    def publish_target(self, tgt_idx, source):
+        target_pos = Point()
+        target_pos.x = float(tgt_idx)
+        self.target_pos_pub.publish(target_pos)
+        self.source = source
+
+    def publish_assignment(self, now):
+        if self.assignment is None or self.assignment["leader"] != self.mav_id-1:
+            return
+        self.assignment["stamp"] = now
+        data = json.dumps(self.assignment)
+        if self.assignment_transport == 'udp':
+            try:
+                self.assignment_sock.sendto(data.encode(), self.assignment_address)
+            except socket.error as e:
+                print("assignment send failed: {!r}".format(e))
+        else:
+            self.assignment_pub.publish(String(data=data))
+        self.published_time = now
 
-            target_pos = Point()
-            # target_pos.x = p_next[self.mav_id-1-cnt_zero_line_of_Pcur][0]
-            # target_pos.y = p_next[self.mav_id-1-cnt_zero_line_of_Pcur][1]
-            # target_pos.z = p_next[self.mav_id-1-cnt_zero_line_of_Pcur][2]
-            target_pos.x = tgt_idx
-            self.target_pos_pub.publish(target_pos)
-            print("target_pos:", self.p_search[int(target_pos.x)])
+    def assignment_recv_loop(self):
+        while not rospy.is_shutdown():
+            try:
+                data, _ = self.assignment_sock.recvfrom(65536)
+            except socket.timeout:
+                continue
+            # anyone can send to the port, a bad datagram must not end the thread
+            try:
+                self.receive_assignment(json.loads(data.decode()))
+            except Exception as e:
+                print("bad assignment datagram: {!r}".format(e))
 
-            time_end = time.time()
-            print("Total time: {} ms".format((time_end - time_start) * 2000))
+    def assignment_callback(self, msg):
+        try:
+            assignment = json.loads(msg.data)
+        except ValueError as e:
+            print("bad assignment message: {!r}".format(e))
+            return
+        self.receive_assignment(assignment)
 
-        self.Pcur = np.zeros((self.mav_num,3))
-        self.p_search = np.zeros((self.mav_num,3))
+    def valid_assignment(self, assignment):
+        # {"leader": int, "seq": int, "mav_ids": [int], "targets": [int]} with ids and
+        # targets in range and one target per mav id
+        def is_int(x):
+            return isinstance(x, int) and not isinstance(x, bool)
+        if not isinstance(assignment, dict):
+            return False
+        leader, seq = assignment.get("leader"), assignment.get("seq")
+        mav_ids, targets = assignment.get("mav_ids"), assignment.get("targets")
+        if not (is_int(leader) and is_int(seq) and 0 <= leader < self.mav_num):
+            return False
+        if not (isinstance(mav_ids, list) and isinstance(targets, list) and len(mav_ids) == len(targets)):
+            return False
+        return all(is_int(i) and 0 <= i < self.mav_num for i in mav_ids) and \
+            all(is_int(t) and 0 <= t < len(self.circle_store) for t in targets)
 
-        self.last_mav_num = this_mav_num
-        self.last_circle_num = this_circle_num
+    def receive_assignment(self, assignment):
+        if not self.valid_assignment(assignment):
+            print("ignored malformed assignment: {!r}".format(assignment)[:200])
+            return
+        if assignment["leader"] == self.mav_id-1:
+            return
+        with self.allocate_lock:
+            now = rospy.get_time()
+            last = self.assignment
+            # a lower seq from the same leader is an old message, unless nothing was
+            # accepted for assignment_timeout: then the leader restarted and counts from 1
+            if last is not None and last["leader"] == assignment["leader"] and assignment["seq"] < last["seq"] \
+                    and now - self.assignment_time < self.assignment_timeout:
+                return
+            if self.mav_id-1 not in assignment["mav_ids"]:
+                return
+            self.assignment_time = now
+            self.assignment = assignment
+            self.fallback_warned = False
+            if last is not None and self.source == "leader" and \
+                    [last[k] for k in ("leader", "seq", "mav_ids", "targets")] == [assignment[k] for k in ("leader", "seq", "mav_ids", "targets")]:
+                return
+            tgt_idx = assignment["targets"][assignment["mav_ids"].index(self.mav_id-1)]
+            self.publish_target(tgt_idx, "leader")
+            print("assignment {} from mav {}: target {}".format(assignment["seq"], assignment["leader"]+1, tgt_idx))
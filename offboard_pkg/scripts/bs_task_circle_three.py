@@ -13,7 +13,7 @@ import numpy as np
 import json5
 
 from rgbd_proc import rgbd_img_proc
-from visual_servo_bs import visual_servo_bs
+from visual_servo_bs import visual_servo_bs, XYR_CTL, FRD_CTL
 from Px4Controller import construct_vel_target
 
 from utils import constrain_rad
@@ -75,6 +75,12 @@ class TaskCircleThree:
 
         self.target_pos_sub = rospy.Subscriber('/allocation/target_pos', Point, self.target_pos_callback)
 
+        # 检测到圆环(半径在伺服的起始范围内)后由视觉伺服接管, 结果比~detection_timeout旧就不用;
+        # 伺服控制阶段丢失超过~detection_loss_time退回动捕引导
+        self.visual_enable = rospy.get_param('~visual_servo', True)
+        self.detection_timeout = rospy.get_param('~detection_timeout', 0.3)
+        self.detection_loss_time = rospy.get_param('~detection_loss_time', 0.5)
+
     def target_pos_callback(self, msg):
         # self.tgt_circle_pos = np.array([msg.x, msg.y, msg.z])
         self.tgt_circle_pos_idx = int(msg.x)
@@ -84,34 +90,84 @@ class TaskCircleThree:
         target_allocater = self.target_allocater
 
 
-        # img_proc = rgbd_img_proc()
         visual_servo = visual_servo_bs()
+        # 检测在自己的线程里跑, 这里只取最新结果; 跟踪窗口按伺服上一次的指令预测
+        img_proc = rgbd_img_proc(servo=visual_servo) if self.visual_enable else None
+        if img_proc is not None:
+            img_proc.start()
 
         debuger = Debuger()
 
-
-        task_state = TASK_ALLOCATION
         mav_id = rospy.get_param('~mav_id', 1)
 
         print("TaskCircleThree mav_id:{}".format(mav_id))
         
-        v_cmd = [0]*3
         tgt_yaw = 0
         visual_servo.reset()
         visual_servo.__dict__.update(vs_dict)
 
         vel = 0.5
-        while True:
-            # print("self.tgt_circle_pos_idx:", self.tgt_circle_pos_idx)
-            self.tgt_circle_pos = target_allocater.p_search[self.tgt_circle_pos_idx]
-            # print("tgt_circle_pos: {}".format(self.tgt_circle_pos))
+        try:
+            self.fly(px4_control, target_allocater, visual_servo, img_proc, debuger, mav_id, tgt_yaw, vel)
+        finally:
+            if img_proc is not None:
+                img_proc.stop()
 
-            if np.all(target_allocater.Pcur[mav_id-1]==0) and np.all(self.tgt_circle_pos==0):
+    def fly(self, px4_control, target_allocater, visual_servo, img_proc, debuger, mav_id, tgt_yaw, vel):
+        task_state = TASK_ALLOCATION
+        last_seq = 0
+        seen_time = 0.
+        while not rospy.is_shutdown():
+            now = rospy.get_time()
+            det = img_proc.latest_detection() if img_proc is not None else None
+            fresh = det is not None and det.found and det.age(now) < self.detection_timeout
+            if fresh:
+                seen_time = now
+
+            if task_state == TASK_ALLOCATION and fresh and visual_servo.switch_to(det.xyr[2]):
+                task_state = TASK_VISUAL
+                print("visual servo: r {:.1f} F {:.2f}".format(det.xyr[2], det.FRD[0]))
+
+            if task_state == TASK_VISUAL:
+                controlling = visual_servo.vs_state in (XYR_CTL, FRD_CTL)
+                if controlling and now - seen_time > self.detection_loss_time:
+                    # 跟丢, 退回动捕引导
+                    print("ring lost, back to mocap")
+                    task_state = TASK_ALLOCATION
+                    visual_servo.reset_state()
+                    img_proc.reset()
+                    continue
+                yaw = px4_control.mav_yaw_odom
+                # 控制阶段只用新的有效结果, 穿越阶段伺服保持上一次的速度
+                if det is not None and det.seq != last_seq and yaw is not None and (fresh or not controlling):
+                    last_seq = det.seq
+                    visual_servo.update_kinematics(px4_control.R_be, yaw)
+                    v_cmd, yaw_rate_cmd = visual_servo.visual_servo_real_update(det.xyr, det.FRD, tgt_yaw)
+                    px4_control.moveByVelocityYawrateBodyFrame(v_cmd[0], v_cmd[1], v_cmd[2], yaw_rate_cmd)
+                    debuger.update({
+                        "task_state": str(visual_servo.vs_state),
+                        "yolo_px": str(det.xyr),
+                        "yolo_frd": str(det.FRD),
+                        "cmdv_flu": str(list(v_cmd)),
+                    })
+                if visual_servo.next_task_flag:
+                    print("Through")
+                    break
+                time.sleep(0.01)
+                continue
+
+            # print("self.tgt_circle_pos_idx:", self.tgt_circle_pos_idx)
+            # consistent read-only snapshots, wait while either pose is missing or stale
+            now = rospy.get_time()
+            mav_pos = target_allocater.mav_store.snapshot().get(mav_id-1, now, target_allocater.stale_timeout)
+            circle_pos = target_allocater.circle_store.snapshot().get(self.tgt_circle_pos_idx, now, target_allocater.stale_timeout)
+            if mav_pos is None or circle_pos is None:
                 time.sleep(0.02)
                 continue
 
-            self.tgt_circle_pos[0] += 1
-            dlt_pos = self.tgt_circle_pos - target_allocater.Pcur[mav_id-1]
+            self.tgt_circle_pos = circle_pos + np.array([1., 0., 0.])
+            # print("tgt_circle_pos: {}".format(self.tgt_circle_pos))
+            dlt_pos = self.tgt_circle_pos - mav_pos
             dlt_pos_yz = np.array([0, dlt_pos[1], dlt_pos[2]])
 
             tag_vel_yz = sat(dlt_pos_yz * 3.0, 3.0)
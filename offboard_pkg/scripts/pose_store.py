@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+
+import numpy as np
+
+
+class PoseSnapshot:
+    """Read-only positions (n x 3) and update times (n) of all slots.
+
+    A snapshot is never written after it has been published, so readers can
+    keep and index it without copying or locking. Slots that were never
+    updated have stamp 0.
+    """
+    __slots__ = ("positions", "stamps", "seq")
+
+    def __init__(self, positions, stamps, seq):
+        self.positions = positions
+        self.stamps = stamps
+        self.seq = seq
+
+    def seen(self):
+        return self.stamps > 0
+
+    def age(self, now):
+        return np.where(self.stamps > 0, now - self.stamps, np.inf)
+
+    def fresh(self, now, timeout):
+        return self.age(now) < timeout
+
+    def get(self, i, now=None, timeout=None):
+        # position of slot i, or None if it was never updated (or is older than timeout)
+        if self.stamps[i] <= 0 or (timeout is not None and now - self.stamps[i] >= timeout):
+            return None
+        return self.positions[i]
+
+
+class PoseStore:
+    """Latest pose of every mocap body, shared between callbacks and control loops.
+
+    Writers serialize on a lock, copy the current snapshot (a few rows), update
+    one slot and publish the copy with a single reference assignment. Readers
+    only take snapshot(): no lock and no copy, and they never see a row that
+    is half written or reset to zero.
+    """
+
+    def __init__(self, n):
+        self.lock = threading.Lock()
+        self.current = self.publish_snapshot(np.zeros((n, 3)), np.zeros(n), 0)
+
+    @staticmethod
+    def publish_snapshot(positions, stamps, seq):
+        positions.flags.writeable = False
+        stamps.flags.writeable = False
+        return PoseSnapshot(positions, stamps, seq)
+
+    def update(self, i, position, stamp=None):
+        stamp = time.time() if stamp is None else stamp
+        with self.lock:
+            last = self.current
+            positions = last.positions.copy()
+            stamps = last.stamps.copy()
+            positions[i] = position
+            stamps[i] = stamp
+            self.current = self.publish_snapshot(positions, stamps, last.seq + 1)
+
+    def snapshot(self):
+        return self.current
+
+    def __len__(self):
+        return len(self.current.stamps)
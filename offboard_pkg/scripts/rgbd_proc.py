@@ -9,14 +9,15 @@ import numpy as np
 
 import rospy
 import threading
+from collections import deque
 
 
-from sensor_msgs.msg import Image as ImageMsg
+from sensor_msgs.msg import Image as ImageMsg, CompressedImage
 from cv_bridge import CvBridge, CvBridgeError
 
 
 
-from rgbd_ring_proc import single_centre_ring_dect
+from rgbd_ring_proc import single_centre_ring_dect, RingTracker, DepthVoter
 
 
 
@@ -37,10 +38,89 @@ colorK = np.mat(
     dtype=float
 )
 
+# 直接读消息缓存的编码: (数据类型, 通道数)
+MSG_ENCODINGS = {
+    "rgb8": (np.uint8, 3),
+    "bgr8": (np.uint8, 3),
+    "16UC1": (np.uint16, 1),
+    "mono16": (np.uint16, 1),
+}
 
 
-class rgbd_img_proc:
+# 不拷贝, 返回指向msg.data的只读数组; 其他编码返回None
+def msg_view(msg):
+    if msg.encoding not in MSG_ENCODINGS:
+        return None
+    dtype, ch = MSG_ENCODINGS[msg.encoding]
+    dtype = np.dtype(dtype).newbyteorder(">" if msg.is_bigendian else "<")
+    if ch == 1:
+        return np.ndarray((msg.height, msg.width), dtype, buffer=msg.data, strides=(msg.step, dtype.itemsize))
+    return np.ndarray((msg.height, msg.width, ch), dtype, buffer=msg.data, strides=(msg.step, dtype.itemsize*ch, dtype.itemsize))
+
+
+
+# 只保留最新值的队列: put覆盖旧值(记为丢弃), get等待比last_seq更新的值
+class LatestValue:
     def __init__(self):
+        self.cond = threading.Condition()
+        self.value = None
+        self.seq = 0
+        self.dropped = 0
+        self.taken = 0
+        self.closed = False
+
+    def put(self,value):
+        with self.cond:
+            if self.seq > self.taken:
+                self.dropped += 1
+            self.value = value
+            self.seq += 1
+            self.cond.notify_all()
+
+    def peek(self):
+        # 读到的值算作已取走, 不计入dropped
+        with self.cond:
+            self.taken = self.seq
+            return self.value, self.seq
+
+    def get(self,last_seq=0,timeout=None):
+        # (value, seq), 超时或关闭时返回(None, last_seq)
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.seq > last_seq or self.closed, timeout) or self.seq <= last_seq:
+                return None, last_seq
+            self.taken = self.seq
+            return self.value, self.seq
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+# 一帧的检测结果
+class RingDetection:
+    __slots__ = ("seq", "xyr", "FRD", "inliers", "stamp", "done", "latency")
+
+    def __init__(self,seq,xyr,FRD,inliers,stamp,done):
+        self.seq = seq
+        self.xyr = xyr
+        self.FRD = FRD
+        self.inliers = inliers
+        # 图像时间戳和检测完成的时间(ROS时间), latency为二者之差
+        self.stamp = stamp
+        self.done = done
+        self.latency = done - stamp
+
+    @property
+    def found(self):
+        return self.xyr[0] != -1
+
+    def age(self,now=None):
+        return (rospy.get_time() if now is None else now) - self.stamp
+
+
+class rgbd_img_proc:
+    def __init__(self,servo=None):
         
         self.img_bridge = CvBridge()
         self.depth_bridge = CvBridge()
@@ -57,8 +137,22 @@ class rgbd_img_proc:
         self.depth_img = None
         self.depth_img_uint8 = None
 
-        self.color_lock = threading.Lock()
-        self.depth_lock = threading.Lock()
+        # 回调只存原始消息, 按时间戳配对后只转换实际处理的那一对, 写进预分配的数组
+        self.lock = threading.Lock()
+        self.color_msgs = deque(maxlen=4)
+        self.depth_msgs = deque(maxlen=4)
+        self.sync_tolerance = rospy.get_param('~sync_tolerance', 0.015)
+        self.color_flip = None
+        self.frame_stamp = 0.
+        self.frame_skew = 0.
+        self.frames_paired = 0
+        self.frames_dropped = 0
+
+        # 跟踪模式只处理预测的窗口, 跟丢后整帧搜索; servo是visual_servo_bs, 用于预测窗口
+        self.tracker = RingTracker(servo=servo) if rospy.get_param('~ring_tracking', True) else None
+        self.voter = self.tracker.voter if self.tracker is not None else DepthVoter()
+        # 上一帧real_dis的内点数
+        self.depth_inliers = 0
 
         
         self.img_cnt = 0
@@ -68,46 +162,196 @@ class rgbd_img_proc:
         self.img_sub = rospy.Subscriber("/d435i/color/image_raw", ImageMsg, self.img_cb)
         self.depth_sub = rospy.Subscriber("/d435i/aligned_depth_to_color/image_raw", ImageMsg, self.depth_cb)
 
-        self.img_res_pub = rospy.Publisher("/bs_debuger/image_res", ImageMsg, queue_size=1)
+        # 调试图像: 最多~debug_rate Hz, 缩放~debug_scale, ~debug_jpeg时发布JPEG压缩图
+        self.debug_rate = rospy.get_param('~debug_rate', 5.0)
+        self.debug_scale = rospy.get_param('~debug_scale', 1.0)
+        self.debug_jpeg = rospy.get_param('~debug_jpeg', False)
+        self.debug_quality = rospy.get_param('~debug_quality', 70)
+        self.debug_time = 0.
+        if self.debug_jpeg:
+            self.img_res_pub = rospy.Publisher("/bs_debuger/image_res/compressed", CompressedImage, queue_size=1)
+        else:
+            self.img_res_pub = rospy.Publisher("/bs_debuger/image_res", ImageMsg, queue_size=1)
+
+        # 流水线: 图像回调(采集) -> 检测线程 -> 调试图像线程, 之间都只传最新值
+        self.frame_event = threading.Event()
+        self.detect_lock = threading.Lock()
+        self.detections = LatestValue()
+        self.debug_frames = LatestValue()
+        self.threads = []
+        self.running = False
+        self.detect_seq = 0
     
     def reset(self):
-        self.circle_xyr = [-1]*3
-        self.circle_FRD = [-1.0]*3
-        self.circle_FRD_px = [-1.0]*3
+        # 检测线程可能正在写这些结果和跟踪状态
+        with self.detect_lock:
+            self.circle_xyr = [-1]*3
+            self.circle_FRD = [-1.0]*3
+            self.circle_FRD_px = [-1.0]*3
+            if self.tracker is not None:
+                self.tracker.reset()
 
 
     # def init_done(self):
     #     return self.color_done and self.depth_done
 
     def img_cb(self,msg):
-        if not self.color_done:
+        with self.lock:
+            self.color_msgs.append(msg)
             self.color_done = True
-        self.color_lock.acquire()
-        cv_image = self.img_bridge.imgmsg_to_cv2(msg, msg.encoding)
-        cv_image = cv2.cvtColor(cv_image, cv2.COLOR_BGR2RGB)
-        self.color_img = cv2.rotate(cv_image, cv2.ROTATE_180)
-        self.color_lock.release()
+        self.frame_event.set()
     
     def depth_cb(self,msg):
-        if not self.depth_done:
+        with self.lock:
+            self.depth_msgs.append(msg)
             self.depth_done = True
-        self.depth_lock.acquire()
-        cv_image = self.img_bridge.imgmsg_to_cv2(msg, msg.encoding)
-        self.depth_img = cv2.rotate(cv_image, cv2.ROTATE_180)
-        self.depth_lock.release()
-    
-   
+        self.frame_event.set()
+
+    def take_pair(self):
+        # 最新的一对时间戳相差不超过sync_tolerance的彩色和深度消息, 更早的消息丢弃
+        with self.lock:
+            best = None
+            for i in range(len(self.color_msgs)-1, -1, -1):
+                t = self.color_msgs[i].header.stamp.to_sec()
+                for j in range(len(self.depth_msgs)-1, -1, -1):
+                    skew = abs(t - self.depth_msgs[j].header.stamp.to_sec())
+                    if skew <= self.sync_tolerance and (best is None or skew < best[2]):
+                        best = (i, j, skew)
+                if best is not None:
+                    break
+            if best is None:
+                return None
+            i, j, skew = best
+            color_msg, depth_msg = self.color_msgs[i], self.depth_msgs[j]
+            self.frames_dropped += i + j
+            for k in range(i+1):
+                self.color_msgs.popleft()
+            for k in range(j+1):
+                self.depth_msgs.popleft()
+            self.color_done = len(self.color_msgs) > 0
+            self.depth_done = len(self.depth_msgs) > 0
+        self.frames_paired += 1
+        return color_msg, depth_msg, skew
+
+    def convert_color(self,msg):
+        # BGR2RGB + 旋转180度
+        raw = msg_view(msg)
+        if raw is None:
+            raw = self.img_bridge.imgmsg_to_cv2(msg, msg.encoding)
+        if self.color_img is None or self.color_img.shape != raw.shape:
+            self.color_flip = np.empty(raw.shape, dtype=raw.dtype)
+            self.color_img = np.empty(raw.shape, dtype=raw.dtype)
+        cv2.flip(raw, -1, self.color_flip)
+        cv2.cvtColor(self.color_flip, cv2.COLOR_BGR2RGB, self.color_img)
+        return self.color_img
+
+    def convert_depth(self,msg):
+        raw = msg_view(msg)
+        if raw is None:
+            raw = self.depth_bridge.imgmsg_to_cv2(msg, msg.encoding)
+        elif raw.dtype.byteorder == ">":
+            raw = raw.astype(np.uint16)
+        if self.depth_img is None or self.depth_img.shape != raw.shape or self.depth_img.dtype != raw.dtype:
+            self.depth_img = np.empty(raw.shape, dtype=raw.dtype)
+        cv2.flip(raw, -1, self.depth_img)
+        return self.depth_img
+
 
     
+    def start(self):
+        # 启动检测和调试图像线程, 之后用latest_detection()取结果
+        if self.running:
+            return
+        self.running = True
+        self.threads = [
+            threading.Thread(target=self.detect_loop, name="ring_detect"),
+            threading.Thread(target=self.debug_loop, name="ring_debug"),
+        ]
+        for th in self.threads:
+            th.daemon = True
+            th.start()
+        rospy.on_shutdown(self.stop)
+
+    def stop(self):
+        self.running = False
+        self.frame_event.set()
+        self.detections.close()
+        self.debug_frames.close()
+        for th in self.threads:
+            if th is not threading.current_thread():
+                th.join(1.0)
+
+    def detect_loop(self):
+        while self.running and not rospy.is_shutdown():
+            self.frame_event.wait(0.1)
+            self.frame_event.clear()
+            while self.running and self.update_ring_info():
+                pass
+
+    def debug_loop(self):
+        seq = 0
+        while self.running and not rospy.is_shutdown():
+            img, seq = self.debug_frames.get(seq, timeout=0.5)
+            if img is not None:
+                self.publish_debug(img)
+
+    def latest_detection(self):
+        # 最新的检测结果(RingDetection), 还没有结果时为None
+        return self.detections.peek()[0]
+
+    def wait_detection(self,last_seq=0,timeout=None):
+        # 等待比last_seq更新的检测结果
+        return self.detections.get(last_seq, timeout)[0]
+
+    def queue_debug(self,img):
+        # 限频, 只在需要发布时拷贝
+        if self.debug_rate <= 0:
+            return
+        now = time.time()
+        if now - self.debug_time < 1.0/self.debug_rate:
+            return
+        self.debug_time = now
+        if self.debug_scale != 1:
+            img = cv2.resize(img, None, fx=self.debug_scale, fy=self.debug_scale, interpolation=cv2.INTER_AREA)
+        else:
+            img = img.copy()
+        if self.running:
+            self.debug_frames.put(img)
+        else:
+            self.publish_debug(img)
+
+    def publish_debug(self,img):
+        if self.debug_jpeg:
+            img_msg = CompressedImage()
+            img_msg.header.stamp = rospy.Time.now()
+            img_msg.format = "jpeg"
+            img_msg.data = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, self.debug_quality])[1].tobytes()
+        else:
+            img_msg = self.res_bridge.cv2_to_imgmsg(img, "bgr8")
+        self.img_res_pub.publish(img_msg)
+
     def update_ring_info(self):
+        # 处理一对新的图像, 没有新的图像时返回False
+        with self.detect_lock:
+            return self.detect_once()
+
+    def detect_once(self):
         result = False
-        if not self.color_done or not self.depth_done:
+        pair = self.take_pair()
+        if pair is None:
             return result
+        result = True
 
-        self.depth_lock.acquire()
-        self.color_lock.acquire()
+        color_msg, depth_msg, self.frame_skew = pair
+        self.frame_stamp = color_msg.header.stamp.to_sec()
+        self.convert_color(color_msg)
+        self.convert_depth(depth_msg)
 
-        img_result = single_centre_ring_dect(self.color_img,self.depth_img)
+        if self.tracker is not None:
+            img_result = self.tracker.update(self.color_img,self.depth_img,now=self.frame_stamp)
+        else:
+            img_result = single_centre_ring_dect(self.color_img,self.depth_img,voter=self.voter)
+        self.depth_inliers = self.voter.inliers if img_result[0] != -1 else 0
         cx,cy,r,real_dis = img_result
         if -1 in [cx,cy]:
             self.circle_xyr = [-1.0]*3
@@ -120,13 +364,11 @@ class rgbd_img_proc:
             self.circle_xyr = [cx,cy,r]
             self.circle_FRD = [F,R,D]
 
-        img_msg = self.res_bridge.cv2_to_imgmsg(self.color_img, "bgr8")
-        self.img_res_pub.publish(img_msg)
+        self.detect_seq += 1
+        self.detections.put(RingDetection(self.detect_seq, self.circle_xyr, self.circle_FRD, self.depth_inliers,
+                                          self.frame_stamp, rospy.get_time()))
+        self.queue_debug(self.color_img)
 
-        self.color_lock.release()
-        self.depth_lock.release()
-        self.color_done = False
-        self.depth_done = False
         self.circle_info_time = time.time()
         return result
 
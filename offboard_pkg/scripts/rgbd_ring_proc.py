@@ -1,10 +1,18 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import time
+
 import cv2
 import numpy as np
-from scipy.optimize import leastsq
 
+from ring_geometry import moments_radius, points_radius, angle_hist, residuals, fit_circle
+
+
+
+# 深度投票的格子, 0.5m一格, 到10m
+DEPTH_BIN_MM = 500
+DEPTH_BINS = 20
 
 
 def color_red_proc(img):
@@ -26,37 +34,54 @@ def color_red_proc(img):
 
 
 # 计算mask内的平均深度
-def depth_vote_proc(depth_float,mask,dis_bias = 0.75):
-    depth_res =  depth_float.copy()
-    hist,bin_edges  = np.histogram(depth_float[mask],bins=20,range=(0,10))
-    id_max = np.argmax(hist[1:])+1
-    dis_mid = bin_edges[id_max]+0.25
-    depth_mask1 = (depth_float > dis_mid+dis_bias)
-    depth_mask2 = (depth_float < dis_mid-dis_bias)
-    depth_res[depth_mask2] = 0
-    depth_res[depth_mask1] = 0
-    mask_available = (depth_res > 0)
-    depth_real = np.average(depth_res[mask_available])
-    return depth_real
-
-
-# 最小二乘拟合圆误差函数
-def residuals(p, xL, yL):
-    xc,yc,r = p
-    rL = [ np.linalg.norm([x-xc,y-yc]) for x,y in zip(xL, yL) ]
-    r_aver = np.average(rL)
-    r_err = np.array([
-        (i-r_aver)**2 + (i-r)**2
-        for i in rL
-    ])
-    return r_err
-
-
-
-
-
-
-def multi_ring_dect(color_img,depth_img):
+# 直接用uint16毫米深度: mask内按0.5m一格计票, 取票数最多的格子(0格和10m以外不算),
+# 返回格子中心±dis_bias内的mask像素的平均深度(m)和内点数, 没有内点返回(0, 0)
+# buf: 预分配的uint16数组(不小于mask像素数), 存放mask内的深度
+def depth_vote_proc(depth_mm,mask,dis_bias = 0.75,buf = None):
+    n = np.count_nonzero(mask)
+    if n == 0:
+        return 0., 0
+    out = buf[:n] if buf is not None else None
+    values = np.compress(mask.ravel(), depth_mm.ravel(), out=out)
+    votes = np.bincount(values // DEPTH_BIN_MM, minlength=DEPTH_BINS+1)
+    id_max = np.argmax(votes[1:DEPTH_BINS])+1
+    dis_mid = id_max*DEPTH_BIN_MM + DEPTH_BIN_MM//2
+    bias = int(dis_bias*1000)
+    inliers = (values >= max(dis_mid-bias, 1)) & (values <= dis_mid+bias)
+    count = int(np.count_nonzero(inliers))
+    if count == 0:
+        return 0., 0
+    depth_real = values.sum(where=inliers, dtype=np.int64)/count/1000
+    return depth_real, count
+
+
+class DepthVoter:
+    '''
+    深度中值滤波和投票用的预分配缓存, 每帧不再分配整帧的数组
+    '''
+    def __init__(self,max_pixels=640*480):
+        self.median_buf = np.empty(max_pixels, dtype=np.uint16)
+        self.values_buf = np.empty(max_pixels, dtype=np.uint16)
+        self.inliers = 0
+
+    def median(self,depth_img):
+        h,w = depth_img.shape[:2]
+        if h*w > len(self.median_buf):
+            self.median_buf = np.empty(h*w, dtype=np.uint16)
+            self.values_buf = np.empty(h*w, dtype=np.uint16)
+        return cv2.medianBlur(depth_img, 5, dst=self.median_buf[:h*w].reshape(h,w))
+
+    def vote(self,depth_mm,mask,dis_bias = 0.75):
+        real_dis, self.inliers = depth_vote_proc(depth_mm,mask,dis_bias,buf=self.values_buf)
+        return real_dis
+
+
+
+
+
+
+def multi_ring_dect(color_img,depth_img,voter=None):
+    voter = DepthVoter() if voter is None else voter
     img_res = color_img
 
     # 颜色图处理
@@ -66,10 +91,7 @@ def multi_ring_dect(color_img,depth_img):
     open_result = cv2.morphologyEx(color_bin, op=cv2.MORPH_OPEN, kernel=kernel, iterations=2)
 
     # 深度图像预处理
-    depth_mf = cv2.medianBlur(depth_img, 5)
-    depth_beyond_mask = (depth_mf > 10000)
-    depth_float = depth_mf/1000
-    depth_float[depth_beyond_mask] = 0
+    depth_mf = voter.median(depth_img)
 
     # 连通域分析
     num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(open_result, connectivity=4)
@@ -85,24 +107,17 @@ def multi_ring_dect(color_img,depth_img):
         cx,cy = centroids[i]
         mask = (labels == i)
         yxL = np.where(mask == True)
-        xL_np = yxL[1] - cx
-        yL_np = yxL[0] - cy
 
-
-        thetaL = [np.arctan2(y,x) for x,y in zip(xL_np,yL_np)]
-
-        hist,_ = np.histogram(thetaL,bins=24,range=(-np.pi,np.pi))
+        hist = angle_hist(yxL[1], yxL[0], cx, cy, bins=24)
         
-        radiusL = [ x**2 + y**2 for x,y in zip(xL_np,yL_np)]
-        r = np.sqrt(np.average(radiusL))
+        r = points_radius(yxL[1], yxL[0], cx, cy)
         
         # 完整的圆直接用计算值
         # 缺少45-60是不完整的圆进行拟合
         if np.sum(hist==0) > 3:
-            pars = [cx,cy,r]
-            cx,cy,r = leastsq(residuals, pars, args=(yxL[1],yxL[0]))[0]
+            cx,cy,r = fit_circle(yxL[1], yxL[0])
 
-        real_dis = depth_vote_proc(depth_float,mask,dis_bias= 0.75)
+        real_dis = voter.vote(depth_mf,mask,dis_bias= 0.75)
         circleL.append([cx,cy,r,real_dis])
 
         cv2.circle(img_res, (int(cx), int(cy)), 3, (255, 255, 255), -1)
@@ -112,7 +127,8 @@ def multi_ring_dect(color_img,depth_img):
 
 
 
-def single_centre_ring_dect(color_img,depth_img,roi_w=200):
+def single_centre_ring_dect(color_img,depth_img,roi_w=200,voter=None):
+    voter = DepthVoter() if voter is None else voter
     img_res = color_img
 
     # 颜色图处理
@@ -124,12 +140,9 @@ def single_centre_ring_dect(color_img,depth_img,roi_w=200):
 
 
     # 深度图像预处理
-    depth_mf = cv2.medianBlur(depth_img, 5)
-    depth_beyond_mask = (depth_mf > 10000)
-    depth_float = depth_mf/1000
-    depth_float[depth_beyond_mask] = 0
+    depth_mf = voter.median(depth_img)
 
-    real_dis = depth_vote_proc(depth_float,color_mask,dis_bias= 0.75)
+    real_dis = voter.vote(depth_mf,color_mask,dis_bias= 0.75)
 
     img_mask = color_mask
     img_bin = color_bin
@@ -144,11 +157,9 @@ def single_centre_ring_dect(color_img,depth_img,roi_w=200):
     if mm['m00'] < 400:
         return [-1]*4
 
-    yxL = np.where(close_result > 0 )
     cx = mm['m10'] / mm['m00']
     cy = mm['m01'] / mm['m00']
-    radiusL = [ (cx-x)**2 + (cy-y)**2 for y,x in zip(yxL[0],yxL[1])]
-    r = np.sqrt(np.average(radiusL))
+    r = moments_radius(mm)
     
     img_res = color_img
     cv2.circle(img_res, (int(cx), int(cy)), 3, (255, 255, 255), -1)
@@ -158,6 +169,138 @@ def single_centre_ring_dect(color_img,depth_img,roi_w=200):
 
 
 
+# 在一个窗口里检测单个圆环, 返回窗口坐标下的cx,cy,r,real_dis, 没有返回[-1]*4
+def ring_window_dect(color_win,depth_win,voter,min_area=400):
+    color_bin = color_red_proc(color_win)
+    color_mask = (color_bin > 0)
+    if np.count_nonzero(color_mask) == 0:
+        return [-1]*4
+
+    # 深度图像预处理
+    depth_mf = voter.median(depth_win)
+
+    real_dis = voter.vote(depth_mf,color_mask,dis_bias= 0.75)
+
+    # 形态学操作
+    kernel_size_unit = np.clip(np.sqrt(np.sum(color_mask))/480*1.5, 0.5, 2)
+    kernel = np.ones(shape=[int(kernel_size_unit*3), int(kernel_size_unit*4)], dtype=np.uint8)
+    open_result = cv2.morphologyEx(color_bin, op=cv2.MORPH_OPEN, kernel=kernel, iterations=2)
+    kernel = np.ones(shape=[int(kernel_size_unit*3*2), int(kernel_size_unit*4*2)], dtype=np.uint8)
+    close_result = cv2.morphologyEx(open_result, op=cv2.MORPH_CLOSE, kernel=kernel, iterations=4)
+
+    mm = cv2.moments(close_result)
+    if mm['m00'] < min_area:
+        return [-1]*4
+    return mm['m10'] / mm['m00'], mm['m01'] / mm['m00'], moments_radius(mm), real_dis
+
+
+class RingTracker:
+    '''
+    单圆环跟踪检测
+    有上一帧结果时只处理预测的窗口: 中心按上两帧的像素速度和伺服的偏航角速度外推,
+    半径按前向速度和距离放大, 窗口边长为若干倍半径
+    跟丢或者没有结果时先在1/2分辨率上粗检测整帧(同single_centre_ring_dect只看中间roi_w列),
+    再在粗结果附近的全分辨率窗口里精检测
+    '''
+    def __init__(self,roi_w=200,margin=1.6,pad=24,pyr_levels=1,servo=None):
+        self.roi_w = roi_w
+        self.margin = margin
+        self.pad = pad
+        self.pyr_levels = pyr_levels
+        # visual_servo_bs, 用它的last_v_cmd和last_yaw_rate_cmd预测
+        self.servo = servo
+        self.voter = DepthVoter()
+        self.tracked = 0
+        self.searches = 0
+        self.reset()
+
+    def reset(self):
+        self.track = None
+        self.velocity = np.zeros(2)
+        self.roi = None
+
+    def predict(self,now):
+        cx,cy,r,dis,t = self.track
+        dt = min(now - t, 0.5)
+        cx,cy = np.array([cx,cy]) + self.velocity*dt
+        if self.servo is not None:
+            cx += self.servo.fx*self.servo.last_yaw_rate_cmd*dt
+            forward = self.servo.last_v_cmd[0]*dt
+            if dis > 0 and dis - forward > 0.3:
+                r *= dis/(dis - forward)
+        return cx,cy,r
+
+    def window(self,cx,cy,r,w,h):
+        half = r*self.margin + self.pad
+        x0 = int(max(cx - half, 320 - self.roi_w, 0))
+        x1 = int(min(cx + half, 320 + self.roi_w, w))
+        y0 = int(max(cy - half, 0))
+        y1 = int(min(cy + half, h))
+        if x1 - x0 < 8 or y1 - y0 < 8:
+            return None
+        return x0,y0,x1,y1
+
+    def window_dect(self,color_img,depth_img,roi):
+        x0,y0,x1,y1 = roi
+        self.roi = roi
+        cx,cy,r,real_dis = ring_window_dect(color_img[y0:y1,x0:x1],depth_img[y0:y1,x0:x1],self.voter)
+        if cx == -1:
+            return [-1]*4
+        return cx+x0,cy+y0,r,real_dis
+
+    def coarse_dect(self,color_img):
+        # 1/2^pyr_levels分辨率上找红色区域的位置和大小
+        small = color_img
+        for i in range(self.pyr_levels):
+            small = cv2.pyrDown(small)
+        scale = 2**self.pyr_levels
+        h,w = small.shape[:2]
+        x0 = max((320 - self.roi_w)//scale, 0)
+        x1 = min((320 + self.roi_w)//scale, w)
+        color_bin = color_red_proc(small[:,x0:x1])
+        kernel = np.ones(shape=[2, 2], dtype=np.uint8)
+        open_result = cv2.morphologyEx(color_bin, op=cv2.MORPH_OPEN, kernel=kernel, iterations=1)
+        mm = cv2.moments(open_result)
+        if mm['m00']*scale*scale < 400:
+            return None
+        cx = (mm['m10']/mm['m00'] + x0)*scale
+        cy = mm['m01']/mm['m00']*scale
+        return cx,cy,moments_radius(mm)*scale
+
+    def update(self,color_img,depth_img,now=None):
+        now = time.time() if now is None else now
+        h,w = depth_img.shape[:2]
+        result = [-1]*4
+        if self.track is not None:
+            roi = self.window(*self.predict(now),w=w,h=h)
+            if roi is not None:
+                result = self.window_dect(color_img,depth_img,roi)
+        if result[0] == -1:
+            self.searches += 1
+            coarse = self.coarse_dect(color_img)
+            if coarse is not None:
+                roi = self.window(*coarse,w=w,h=h)
+                if roi is not None:
+                    result = self.window_dect(color_img,depth_img,roi)
+        else:
+            self.tracked += 1
+
+        if result[0] == -1:
+            self.reset()
+            return result
+
+        cx,cy,r,real_dis = result
+        if self.track is not None:
+            dt = now - self.track[4]
+            if dt > 0:
+                self.velocity = 0.5*self.velocity + 0.5*(np.array([cx,cy]) - self.track[:2])/dt
+        self.track = np.array([cx,cy,r,real_dis,now])
+
+        cv2.circle(color_img, (int(cx), int(cy)), 3, (255, 255, 255), -1)
+        cv2.circle(color_img, (int(cx), int(cy)), int(r), (255, 255, 255), 2)
+        return result
+
+
 
 if __name__ == '__main__':
     color_path = "data/2022-12-06-18-04-50/00010.png"
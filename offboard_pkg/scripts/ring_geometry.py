@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+from scipy.optimize import leastsq
+
+
+# 前景像素到(cx,cy)的均方根半径, 由cv2.moments的二阶中心矩直接得到
+def moments_radius(mm):
+    return np.sqrt((mm['mu20'] + mm['mu02']) / mm['m00'])
+
+
+# 点集到(cx,cy)的均方根半径
+def points_radius(xL, yL, cx, cy):
+    dx = np.asarray(xL, dtype=float) - cx
+    dy = np.asarray(yL, dtype=float) - cy
+    return np.sqrt(np.mean(dx*dx + dy*dy))
+
+
+# 点集相对(cx,cy)的方位角直方图, 用于判断圆环是否完整
+def angle_hist(xL, yL, cx, cy, bins=24):
+    thetaL = np.arctan2(np.asarray(yL, dtype=float) - cy, np.asarray(xL, dtype=float) - cx)
+    hist,_ = np.histogram(thetaL, bins=bins, range=(-np.pi,np.pi))
+    return hist
+
+
+# 最小二乘拟合圆误差函数
+def residuals(p, xL, yL):
+    xc,yc,r = p
+    rL = np.hypot(xL - xc, yL - yc)
+    r_aver = np.mean(rL)
+    return (rL - r_aver)**2 + (rL - r)**2
+
+
+# residuals对(xc,yc,r)的解析雅可比
+def residuals_jac(p, xL, yL):
+    xc,yc,r = p
+    dx = xL - xc
+    dy = yL - yc
+    rL = np.hypot(dx, dy)
+    rL[rL == 0] = 1e-12
+    r_aver = np.mean(rL)
+    # drL/dxc, drL/dyc
+    ddx = -dx / rL
+    ddy = -dy / rL
+    jac = np.empty((len(rL), 3))
+    jac[:,0] = 2*(rL - r_aver)*(ddx - ddx.mean()) + 2*(rL - r)*ddx
+    jac[:,1] = 2*(rL - r_aver)*(ddy - ddy.mean()) + 2*(rL - r)*ddy
+    jac[:,2] = -2*(rL - r)
+    return jac
+
+
+# 代数拟合(Kasa): 最小化 sum(x^2+y^2+D*x+E*y+F)^2, 一次线性最小二乘
+def fit_circle_kasa(xL, yL):
+    x = np.asarray(xL, dtype=float)
+    y = np.asarray(yL, dtype=float)
+    # 去均值, 改善条件数
+    mx, my = x.mean(), y.mean()
+    u, v = x - mx, y - my
+    A = np.column_stack([u, v, np.ones_like(u)])
+    b = -(u*u + v*v)
+    (D, E, F), _, _, _ = np.linalg.lstsq(A, b, rcond=None)
+    uc, vc = -D/2, -E/2
+    r = np.sqrt(max(uc*uc + vc*vc - F, 0.))
+    return mx + uc, my + vc, r
+
+
+# 代数拟合给初值, 再用解析雅可比的leastsq细化residuals
+def fit_circle(xL, yL, pars=None):
+    x = np.asarray(xL, dtype=float)
+    y = np.asarray(yL, dtype=float)
+    if pars is None:
+        pars = fit_circle_kasa(x, y)
+    return leastsq(residuals, pars, args=(x, y), Dfun=residuals_jac)[0]
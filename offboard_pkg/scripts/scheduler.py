@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+
+import numpy as np
+
+
+class PeriodicTask:
+    def __init__(self, name, callback, period, history=1000):
+        self.name = name
+        self.callback = callback
+        self.period = period
+        self.deadline = 0.
+        self.count = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.errors = 0
+        # start - deadline and callback duration of the last runs, seconds
+        self.jitter = deque(maxlen=history)
+        self.duration = deque(maxlen=history)
+
+    def stats(self):
+        jitter = np.array(self.jitter) * 1000
+        duration = np.array(self.duration) * 1000
+        return {
+            "rate": 1. / self.period,
+            "count": self.count,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "jitter_mean_ms": float(jitter.mean()) if len(jitter) else 0.,
+            "jitter_p99_ms": float(np.percentile(jitter, 99)) if len(jitter) else 0.,
+            "jitter_max_ms": float(jitter.max()) if len(jitter) else 0.,
+            "duration_max_ms": float(duration.max()) if len(duration) else 0.,
+        }
+
+
+class PeriodicScheduler:
+    '''
+    一个线程按单调时钟的绝对截止时间运行多个周期任务
+    下一次的截止时间 = 上一次截止时间 + 周期, 不会因为回调耗时和sleep误差漂移
+    错过一个以上周期时(overrun)跳过错过的周期, 保持相位
+    '''
+    def __init__(self, name="scheduler", daemon=False):
+        self.name = name
+        self.daemon = daemon
+        self.tasks = dict()
+        self.queue = list()
+        self.order = itertools.count()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.wake_event = threading.Event()
+        self.thread = None
+
+    def add(self, name, callback, rate):
+        task = PeriodicTask(name, callback, 1. / rate)
+        with self.lock:
+            self.tasks[name] = task
+            task.deadline = time.monotonic()
+            heapq.heappush(self.queue, (task.deadline, next(self.order), task))
+        self.wake_event.set()
+        return task
+
+    def remove(self, name):
+        with self.lock:
+            self.tasks.pop(name, None)
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name=self.name)
+        self.thread.daemon = self.daemon
+        self.thread.start()
+
+    def stop(self, timeout=1.0):
+        self.stop_event.set()
+        self.wake_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+        return self.thread is None or not self.thread.is_alive()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            with self.lock:
+                # drop entries of removed tasks
+                while self.queue and self.tasks.get(self.queue[0][2].name) is not self.queue[0][2]:
+                    heapq.heappop(self.queue)
+                deadline, _, task = self.queue[0] if self.queue else (None, None, None)
+            if task is None:
+                self.wake_event.wait()
+                self.wake_event.clear()
+                continue
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                # woken early by add() or stop(), look at the queue again
+                if self.wake_event.wait(delay):
+                    self.wake_event.clear()
+                    continue
+
+            with self.lock:
+                if not self.queue or self.queue[0][2] is not task:
+                    continue
+                heapq.heappop(self.queue)
+            start = time.monotonic()
+            try:
+                task.callback()
+            except Exception as e:
+                task.errors += 1
+                print("{} failed: {!r}".format(task.name, e))
+            end = time.monotonic()
+            task.count += 1
+            task.jitter.append(start - deadline)
+            task.duration.append(end - start)
+
+            task.deadline = deadline + task.period
+            if task.deadline <= end:
+                missed = int((end - task.deadline) // task.period) + 1
+                task.overruns += 1
+                task.skipped += missed
+                task.deadline += missed * task.period
+            with self.lock:
+                if self.tasks.get(task.name) is task:
+                    heapq.heappush(self.queue, (task.deadline, next(self.order), task))
+
+    def stats(self):
+        with self.lock:
+            tasks = list(self.tasks.values())
+        return {task.name: task.stats() for task in tasks}
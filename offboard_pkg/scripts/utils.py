@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import math
+
 import numpy as np
 
 # 饱和
@@ -52,6 +54,85 @@ def eulerAngleToMatrix(rpy):
     return R
 
 
+# 四元数(w,x,y,z)转旋转矩阵, 与eulerAngleToMatrix(quaternionToEuler(q))相同, 支持批量(...,4)->(...,3,3)
+def quaternionToMatrix(q, out=None):
+    q = np.asarray(q, dtype=float)
+    w, x, y, z = np.moveaxis(q, -1, 0)
+    s = 2. / np.sum(q * q, axis=-1)
+    if out is None:
+        out = np.empty(q.shape[:-1] + (3, 3))
+    out[..., 0, 0] = 1 - s*(y*y + z*z)
+    out[..., 0, 1] = s*(x*y - w*z)
+    out[..., 0, 2] = s*(x*z + w*y)
+    out[..., 1, 0] = s*(x*y + w*z)
+    out[..., 1, 1] = 1 - s*(x*x + z*z)
+    out[..., 1, 2] = s*(y*z - w*x)
+    out[..., 2, 0] = s*(x*z - w*y)
+    out[..., 2, 1] = s*(y*z + w*x)
+    out[..., 2, 2] = 1 - s*(x*x + y*y)
+    return out
+
+
+# 四元数(w,x,y,z)转欧拉角roll,pitch,yaw (Z-Y-X), 支持批量(...,4)->(...,3)
+def quaternionToEuler(q):
+    q = np.asarray(q, dtype=float)
+    q = q / np.linalg.norm(q, axis=-1, keepdims=True)
+    q0, q1, q2, q3 = np.moveaxis(q, -1, 0)
+    roll = np.arctan2(2*(q0*q1 + q2*q3), 1-2*(q1*q1 + q2*q2))
+    pitch = np.arcsin(np.clip(2*(q0*q2 - q3*q1), -1, 1))
+    yaw = np.arctan2(2*(q0*q3 + q1*q2), 1-2*(q2*q2 + q3*q3))
+    return np.stack([roll, pitch, yaw], axis=-1)
+
+
+class Attitude:
+    '''
+    位姿回调用的姿态: 旋转矩阵直接由四元数算出, 欧拉角用到时才算
+    每次update都返回新的只读R, 取走的R之后不会被改写, 可以一直持有
+    '''
+    def __init__(self):
+        self.R = np.identity(3)
+        self.R.flags.writeable = False
+        self.quat = (1., 0., 0., 0.)
+        self.euler = None
+        self.valid = False
+
+    def update(self, q0, q1, q2, q3):
+        n = (q0*q0 + q1*q1 + q2*q2 + q3*q3) ** 0.5
+        q0, q1, q2, q3 = q0/n, q1/n, q2/n, q3/n
+        R = np.empty((3, 3))
+        R[0] = 1 - 2*(q2*q2 + q3*q3), 2*(q1*q2 - q0*q3), 2*(q1*q3 + q0*q2)
+        R[1] = 2*(q1*q2 + q0*q3), 1 - 2*(q1*q1 + q3*q3), 2*(q2*q3 - q0*q1)
+        R[2] = 2*(q1*q3 - q0*q2), 2*(q2*q3 + q0*q1), 1 - 2*(q1*q1 + q2*q2)
+        R.flags.writeable = False
+        self.R = R
+        self.quat = (q0, q1, q2, q3)
+        self.euler = None
+        self.valid = True
+        return R
+
+    def rpy(self):
+        if self.euler is None:
+            q0, q1, q2, q3 = self.quat
+            self.euler = (
+                math.atan2(2*(q0*q1 + q2*q3), 1-2*(q1*q1 + q2*q2)),
+                math.asin(min(1., max(-1., 2*(q0*q2 - q3*q1)))),
+                math.atan2(2*(q0*q3 + q1*q2), 1-2*(q2*q2 + q3*q3)),
+            )
+        return self.euler
+
+    @property
+    def roll(self):
+        return self.rpy()[0]
+
+    @property
+    def pitch(self):
+        return self.rpy()[1]
+
+    @property
+    def yaw(self):
+        return self.rpy()[2]
+
+
 if __name__=="__main__":
     R = eulerAngleToMatrix([np.deg2rad(-0.69),np.deg2rad(1.84),np.deg2rad(3.14)])
     print(R)
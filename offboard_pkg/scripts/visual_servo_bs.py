@@ -158,6 +158,7 @@ class visual_servo_bs:
 
         self.last_R = r
         self.last_v_cmd = v_cmd
+        self.last_yaw_rate_cmd = yaw_rate_cmd
         return v_cmd, yaw_rate_cmd
 
 
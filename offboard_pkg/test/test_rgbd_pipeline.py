@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# 检测线程: 喂彩色和深度帧, latest_detection()要拿到新结果
+# 需要roscore: catkin run_tests offboard_pkg  或  python test_rgbd_pipeline.py
+
+import os
+import sys
+import unittest
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+try:
+    import rospy
+    import rosgraph
+    from sensor_msgs.msg import Image as ImageMsg
+    ROS_OK = rosgraph.is_master_online()
+except ImportError:
+    ROS_OK = False
+
+
+def image_msg(arr, encoding, stamp):
+    msg = ImageMsg()
+    msg.header.stamp = stamp
+    msg.height, msg.width = arr.shape[:2]
+    msg.encoding = encoding
+    msg.is_bigendian = 0
+    msg.step = arr.strides[0]
+    msg.data = arr.tobytes()
+    return msg
+
+
+def ring_frame(cx, cy, r=60):
+    img = np.full((480, 640, 3), 90, np.uint8)
+    cv2.circle(img, (cx, cy), r, (200, 0, 0), 14)
+    return img
+
+
+@unittest.skipUnless(ROS_OK, "needs rospy and a running roscore")
+class TestRgbdPipeline(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        rospy.init_node("test_rgbd_pipeline", anonymous=True, disable_signals=True)
+
+    def setUp(self):
+        from rgbd_proc import rgbd_img_proc
+        self.proc = rgbd_img_proc()
+        self.proc.start()
+        self.depth = np.full((480, 640), 3000, np.uint16)
+
+    def tearDown(self):
+        self.proc.stop()
+
+    def feed(self, img):
+        stamp = rospy.Time.now()
+        self.proc.img_cb(image_msg(img, "rgb8", stamp))
+        self.proc.depth_cb(image_msg(self.depth, "16UC1", stamp))
+
+    def test_latest_detection_follows_new_frames(self):
+        self.assertIsNone(self.proc.latest_detection())
+
+        self.feed(ring_frame(260, 220))
+        first = self.proc.wait_detection(0, timeout=2.0)
+        self.assertIsNotNone(first)
+        self.assertTrue(first.found)
+        self.assertIs(self.proc.latest_detection(), first)
+
+        self.feed(ring_frame(300, 220))
+        second = self.proc.wait_detection(first.seq, timeout=2.0)
+        self.assertIsNotNone(second)
+        self.assertGreater(second.seq, first.seq)
+        self.assertIs(self.proc.latest_detection(), second)
+        # 图像旋转了180度, 环右移后检测结果左移
+        self.assertLess(second.xyr[0], first.xyr[0])
+        self.assertLess(second.age(), 1.0)
+
+    def test_stop_joins_threads(self):
+        self.proc.stop()
+        for th in self.proc.threads:
+            self.assertFalse(th.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# 跟踪窗口的预测: 不需要roscore
+# catkin run_tests offboard_pkg  或  python test_ring_tracker.py
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from rgbd_ring_proc import RingTracker
+from visual_servo_bs import visual_servo_bs
+
+
+def tracker(servo=None, yaw_rate=0., vx=0.):
+    if servo is None and (yaw_rate or vx):
+        servo = visual_servo_bs()
+        servo.reset()
+    if servo is not None:
+        servo.last_yaw_rate_cmd = yaw_rate
+        servo.last_v_cmd = np.array([vx, 0., 0.])
+    t = RingTracker(servo=servo)
+    # 上一帧: 中心(320,240), 半径40, 距离3m, t=10s, 像素速度为0
+    t.track = np.array([320., 240., 40., 3.0, 10.0])
+    return t
+
+
+class TestRingTrackerPredict(unittest.TestCase):
+    def test_yaw_rate_shifts_window(self):
+        dt = 0.1
+        still = tracker()
+        turning = tracker(yaw_rate=0.2)
+        cx0, cy0, r0 = still.predict(10.0 + dt)
+        cx1, cy1, r1 = turning.predict(10.0 + dt)
+        self.assertAlmostEqual(cx1 - cx0, turning.servo.fx*0.2*dt)
+        self.assertEqual((cy1, r1), (cy0, r0))
+
+        x0, y0, x1, y1 = still.window(cx0, cy0, r0, 640, 480)
+        u0, v0, u1, v1 = turning.window(cx1, cy1, r1, 640, 480)
+        shift = int(round(turning.servo.fx*0.2*dt))
+        self.assertGreater(shift, 0)
+        self.assertEqual((v0, v1), (y0, y1))
+        self.assertAlmostEqual(u0 - x0, shift, delta=1)
+        self.assertAlmostEqual(u1 - x1, shift, delta=1)
+
+    def test_zero_yaw_rate_matches_no_servo(self):
+        servo = visual_servo_bs()
+        servo.reset()
+        self.assertEqual(tracker(servo=servo).predict(10.1), tracker().predict(10.1))
+
+    def test_forward_speed_grows_radius(self):
+        cx, cy, r = tracker(vx=1.0).predict(10.5)
+        self.assertAlmostEqual(r, 40*3.0/(3.0 - 0.5))
+
+
+if __name__ == "__main__":
+    unittest.main()